@@ -1,5 +1,90 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
 
+from .deletion import delete_comments
 from .models import Comments
+from .search import filter_comments
 
-admin.site.register(Comments)
+
+def estimated_count(model, using):
+    """
+    Row count of model's table from the planner statistics, or None when the
+    database keeps none (SQLite only has them after ANALYZE).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [table])
+            elif connection.vendor == "sqlite":
+                # The first number of every row of a table is its row count.
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    count = int(float(str(row[0]).split()[0]))
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    return count if count >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts unfiltered changelists of large tables from the statistics, not COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+@admin.register(Comments)
+class CommentsAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "excerpt", "reply_to", "home")
+    list_select_related = ("user",)
+    ordering = ("-id",)
+    search_fields = ("text",)
+    autocomplete_fields = ("user",)
+    raw_id_fields = ("reply",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["delete_in_batches"]
+
+    @admin.display(description="text")
+    def excerpt(self, obj):
+        return Truncator(obj.text).chars(80)
+
+    @admin.display(description="reply", ordering="reply_id")
+    def reply_to(self, obj):
+        # The parent's id is enough, and doesn't need another join.
+        return obj.reply_id
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(id=search_term), False
+        return filter_comments(queryset, search_term), False
+
+    def get_actions(self, request):
+        # The default delete action loads every selected comment and its replies.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(permissions=["delete"], description="Delete selected comments in batches")
+    def delete_in_batches(self, request, queryset):
+        deleted = delete_comments(queryset)
+        self.message_user(request, "Deleted %d comments." % deleted, messages.SUCCESS)
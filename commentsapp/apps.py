@@ -1,6 +1,43 @@
 from django.apps import AppConfig
+from django.db import connections
 
 
 class CommentsappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'commentsapp'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import (
+            post_delete,
+            post_migrate,
+            post_save,
+            pre_delete,
+            pre_save,
+        )
+
+        from . import changes, hot, sharding, stats
+        from .models import Comments
+
+        post_save.connect(stats.user_created, sender=User)
+        pre_save.connect(stats.comment_pre_save, sender=Comments)
+        post_save.connect(stats.comment_saved, sender=Comments)
+        pre_delete.connect(stats.comment_pre_delete, sender=Comments)
+        post_save.connect(changes.comment_saved, sender=Comments)
+        post_delete.connect(changes.comment_deleted, sender=Comments)
+        post_save.connect(hot.comment_saved, sender=Comments)
+        pre_delete.connect(hot.comment_pre_delete, sender=Comments)
+        post_delete.connect(hot.comment_deleted, sender=Comments)
+        post_save.connect(changes.user_saved, sender=User)
+        post_delete.connect(changes.user_deleted, sender=User)
+        post_save.connect(sharding.user_saved, sender=User)
+        post_delete.connect(sharding.user_deleted, sender=User)
+        post_migrate.connect(self.reinstall_search_index, sender=self)
+        post_migrate.connect(sharding.shard_migrated, sender=self)
+
+    def reinstall_search_index(self, using, **kwargs):
+        # SQLite drops the search triggers whenever a migration rebuilds the table.
+        from .search import install_search_index
+
+        if connections[using].vendor == "sqlite":
+            install_search_index(connections[using])
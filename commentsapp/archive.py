@@ -0,0 +1,175 @@
+"""
+Archival of cold threads.
+
+A thread, a root comment and all its replies, is cold once none of its comments is
+newer than ARCHIVE_AFTER_DAYS. Cold threads are found through their ThreadActivity
+score, which is at least the time of the thread's last comment (see hot.py), and
+moved whole into the ArchivedComment table, keeping Comments and its indexes down to
+the live threads. Archived comments are read-only: retrieve() still finds them, but
+they aren't listed, searched or replied to anymore.
+
+On PostgreSQL the archive is range partitioned by month of created_at, so old
+months can be detached or moved to cheaper storage. Other databases keep a plain
+table.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .changes import record_changes
+from .models import ArchivedComment, Change, Comments, ThreadActivity
+from .sharding import merged, shard_for
+
+logger = logging.getLogger(__name__)
+
+TABLE = ArchivedComment._meta.db_table
+
+POSTGRESQL_PARTITIONED_TABLE = [
+    "DROP TABLE {table}",
+    "CREATE TABLE {table} ("
+    " id bigint NOT NULL,"
+    " user_id integer NOT NULL REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,"
+    " home varchar(200) NOT NULL,"
+    " text text NOT NULL,"
+    " reply bigint NULL,"
+    " reply_user_id integer NULL,"
+    " created_at timestamp with time zone NOT NULL,"
+    " archived_at timestamp with time zone NOT NULL,"
+    # The partition key must be part of the primary key.
+    " PRIMARY KEY (id, created_at)"
+    ") PARTITION BY RANGE (created_at)",
+    "CREATE TABLE {table}_default PARTITION OF {table} DEFAULT",
+    "CREATE INDEX {table}_user_id ON {table} (user_id)",
+    "CREATE INDEX {table}_reply ON {table} (reply)",
+    "CREATE INDEX {table}_reply_user_id ON {table} (reply_user_id)",
+]
+
+
+def partition_archive(connection):
+    """Replace the empty archive table by a partitioned one on PostgreSQL."""
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRESQL_PARTITIONED_TABLE:
+            cursor.execute(statement.format(table=TABLE))
+
+
+def _month(date):
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(date):
+    return _month(_month(date) + timedelta(days=32))
+
+
+def add_partitions(connection, dates):
+    """Create the monthly partitions of the archive holding dates, if missing."""
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for month in sorted({_month(date) for date in dates}):
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS {table}_{suffix} PARTITION OF {table}"
+                " FOR VALUES FROM (%s) TO (%s)".format(
+                    table=TABLE, suffix=month.strftime("y%Ym%m")
+                ),
+                [month, _next_month(month)],
+            )
+
+
+def thread_ids(root_id, using=None, lock=False):
+    """
+    Ids of root_id and all its replies, one query per level. With lock, the comments
+    are locked level by level, so no reply can be added to them until the end of the
+    transaction.
+    """
+    comments = Comments.objects.using(using)
+    if lock:
+        comments = comments.select_for_update()
+        if not comments.filter(id=root_id).exists():
+            return []
+    ids, level = [root_id], [root_id]
+    while level:
+        level = list(comments.filter(reply_id__in=level).values_list("id", flat=True))
+        ids.extend(level)
+    return ids
+
+
+def cold_score(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return cutoff.timestamp() / settings.HOT_THREADS_HALF_LIFE
+
+
+def archive_thread(root_id, days):
+    """
+    Move the thread of root_id to the archive if it's still cold. Returns the number
+    of archived comments.
+    """
+    using = shard_for(root_id)
+    with transaction.atomic(using=using):
+        # A reply is committed before hot.record_activity() updates the activity, so
+        # lock the comments first: replies to them wait for the archive to commit (and
+        # then fail), and those committed in the meantime are in the thread or the
+        # activity checked below.
+        ids = thread_ids(root_id, using, lock=True)
+        activity = (
+            ThreadActivity.objects.using(using)
+            .select_for_update()
+            .filter(root_id=root_id)
+            .first()
+        )
+        if activity is None or activity.score >= cold_score(days):
+            return 0
+        comments = Comments.objects.using(using).filter(id__in=ids)
+        rows = list(
+            comments.values(
+                "id", "user_id", "home", "text", "reply_id", "reply__user_id", "created_at"
+            )
+        )
+        add_partitions(connections[comments.db], [row["created_at"] for row in rows])
+        ArchivedComment.objects.using(comments.db).bulk_create(
+            [
+                ArchivedComment(
+                    id=row["id"],
+                    user_id=row["user_id"],
+                    home=row["home"],
+                    text=row["text"],
+                    reply=row["reply_id"],
+                    reply_user_id=row["reply__user_id"],
+                    created_at=row["created_at"],
+                )
+                for row in rows
+            ]
+        )
+        activity.delete()
+        # The comments still exist, so skip the signals updating the counters and
+        # logging deletes; they're logged as updates, read from the archive.
+        comments._raw_delete(comments.db)
+        record_changes(Change.COMMENT, Change.UPDATE, [row["id"] for row in rows])
+        return len(rows)
+
+
+def archive_cold_threads(days=None, limit=None):
+    """
+    Archive the threads without comments in the last days, limit threads at most.
+    Returns the number of (threads, comments) archived.
+    """
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    roots = ThreadActivity.objects.filter(score__lt=cold_score(days)).order_by("score")
+    roots = roots.values_list("score", "root_id")
+    root_ids = [root_id for _, root_id in merged(roots, key=lambda row: row[0], limit=limit)]
+    threads = archived = 0
+    for root_id in root_ids:
+        try:
+            count = archive_thread(root_id, days)
+        except Exception:
+            # E.g. a reply added in between, on a database without row locks.
+            logger.exception("Archiving thread %s failed", root_id)
+            continue
+        threads += bool(count)
+        archived += count
+    return threads, archived
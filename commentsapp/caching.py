@@ -0,0 +1,162 @@
+"""
+Page caching of the read endpoints: cache_page with request coalescing, and cache
+warming.
+
+When a cached page expires, every request for it misses at the same time and
+rebuilds it. coalesced_cache_page lets the first of them rebuild the page and makes
+the others wait for it and read it from the cache instead. Requests are coalesced
+within a process, which is where the misses are with the default local memory cache.
+
+warm_cache() requests the list pages, the first pages of hot threads and those
+threads, so that they're cached before the first client asks for them. It's run by
+the warm_cache command, and on startup by the web process when WARM_CACHE_ON_STARTUP
+is set.
+"""
+
+import json
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.middleware.cache import CacheMiddleware
+from django.urls import resolve, reverse
+from django.utils.decorators import decorator_from_middleware_with_args
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+logger = logging.getLogger(__name__)
+
+_flights = {}
+_flights_lock = threading.Lock()
+# Set once warm_cache_in_background() is done, successfully or not.
+cache_warmed = threading.Event()
+
+
+def join_flight(key):
+    """
+    None when the caller is the first to ask for key and must compute it, otherwise
+    an event set once the first caller is done.
+    """
+    with _flights_lock:
+        event = _flights.get(key)
+        if event is None:
+            _flights[key] = threading.Event()
+        return event
+
+
+def land_flight(key):
+    with _flights_lock:
+        event = _flights.pop(key, None)
+    if event is not None:
+        event.set()
+
+
+class CoalescingCacheMiddleware(CacheMiddleware):
+    def flight_key(self, request):
+        return "%s:%s:%s" % (
+            self.key_prefix,
+            request.build_absolute_uri(),
+            request.META.get("HTTP_ACCEPT", ""),
+        )
+
+    def process_request(self, request):
+        response = super().process_request(request)
+        if response is not None or not request._cache_update_cache:
+            return response
+        key = self.flight_key(request)
+        event = join_flight(key)
+        if event is None:
+            request._cache_flight = key
+            return None
+        # Once the first request is done the page is cached, unless it failed or
+        # isn't cacheable; then this one computes it too.
+        event.wait(settings.CACHE_COALESCE_TIMEOUT)
+        return super().process_request(request)
+
+    def process_response(self, request, response):
+        try:
+            return super().process_response(request, response)
+        finally:
+            self.land(request)
+
+    def process_exception(self, request, exception):
+        self.land(request)
+
+    def land(self, request):
+        key = getattr(request, "_cache_flight", None)
+        if key is not None:
+            del request._cache_flight
+            land_flight(key)
+
+
+def coalesced_cache_page(timeout, *, cache=None, key_prefix=None):
+    """cache_page, with concurrent misses of a page computing it once."""
+    return decorator_from_middleware_with_args(CoalescingCacheMiddleware)(
+        page_timeout=timeout, cache_alias=cache, key_prefix=key_prefix
+    )
+
+
+def warm_cache(pages=None):
+    """
+    Cache the list pages, the first pages of hot threads and the threads on them.
+    Returns the number of pages requested.
+    """
+    pages = settings.WARM_CACHE_PAGES if pages is None else pages
+    # The cached pages are the same for every user, any of them can request them.
+    user = User.objects.filter(is_active=True).order_by("id").first()
+    if user is None:
+        return 0
+    factory = APIRequestFactory()
+
+    def get(url):
+        """Request url as every client variant would, and return its JSON data."""
+        split = urlsplit(url)
+        path = split.path + ("?" + split.query if split.query else "")
+        match = resolve(split.path)
+        data = None
+        for host in settings.WARM_CACHE_HOSTS:
+            for accept in settings.WARM_CACHE_ACCEPT:
+                request = factory.get(path, HTTP_HOST=host, HTTP_ACCEPT=accept)
+                force_authenticate(request, user)
+                response = match.func(request, *match.args, **match.kwargs)
+                if hasattr(response, "render"):
+                    response.render()
+                if response.status_code != 200:
+                    logger.warning("Warming %s failed with %s", path, response.status_code)
+                    return None
+                if response["Content-Type"].startswith("application/json"):
+                    data = json.loads(response.content)
+        return data
+
+    requested = 0
+    for url in (reverse("comment-list"), reverse("user-list")):
+        get(url)
+        requested += 1
+    url = reverse("comment-hot")
+    for _ in range(pages):
+        page = get(url)
+        requested += 1
+        if not page:
+            break
+        for thread in page["results"]:
+            get(reverse("comment-detail", args=[thread["id"]]))
+            requested += 1
+        url = page["next"]
+        if url is None:
+            break
+    return requested
+
+
+def warm_cache_in_background():
+    def run():
+        try:
+            logger.info("Warmed %d pages", warm_cache())
+        except Exception:
+            logger.exception("Warming the cache failed")
+        finally:
+            connections.close_all()
+            cache_warmed.set()
+
+    threading.Thread(target=run, name="cache-warmer", daemon=True).start()
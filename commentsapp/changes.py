@@ -0,0 +1,140 @@
+"""
+Change log of Comments and User for incremental sync.
+
+Every create, update and delete appends a Change in the same transaction as the
+write: through signals for single objects, and explicitly for the bulk writes of
+deletion.py, which skip the signals. Clients poll /changes/?since=<seq> and get the
+events after seq in order, with the current state of each object.
+
+Sequence numbers are handed out at insert but become visible at commit, so a
+concurrent transaction can commit a lower seq after a higher one was read. SQLite
+serializes the writing transactions, so there seqs are committed in order. On
+PostgreSQL a trigger stores the transaction id (txid) of every change, and changes
+are served in (txid, seq) order, only from the transactions below the oldest one
+still running: those have all ended, and any change committed later sorts after
+them. Other databases serve changes once they're CHANGES_SETTLE_SECONDS old.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedComment, Change, Comments
+from .sharding import in_bulk
+
+TABLE = Change._meta.db_table
+
+POSTGRESQL_COMMIT_ORDER = [
+    "CREATE FUNCTION {table}_txid() RETURNS trigger AS $$"
+    " BEGIN NEW.txid := txid_current(); RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER {table}_txid BEFORE INSERT ON {table}"
+    " FOR EACH ROW EXECUTE PROCEDURE {table}_txid()",
+    # The changes logged so far are committed.
+    "UPDATE {table} SET txid = 0",
+]
+
+
+def install_commit_order(connection):
+    """Record the transaction id of every change on PostgreSQL."""
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRESQL_COMMIT_ORDER:
+            cursor.execute(statement.format(table=TABLE))
+
+
+def uninstall_commit_order(connection):
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS {table}_txid ON {table}".format(table=TABLE))
+        cursor.execute("DROP FUNCTION IF EXISTS {table}_txid()".format(table=TABLE))
+
+
+def record_changes(model, action, object_ids):
+    Change.objects.bulk_create(
+        [Change(model=model, action=action, object_id=object_id) for object_id in object_ids]
+    )
+
+
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_changes(Change.COMMENT, Change.CREATE if created else Change.UPDATE, [instance.pk])
+
+
+def comment_deleted(sender, instance, **kwargs):
+    record_changes(Change.COMMENT, Change.DELETE, [instance.pk])
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_changes(Change.USER, Change.CREATE if created else Change.UPDATE, [instance.pk])
+
+
+def user_deleted(sender, instance, **kwargs):
+    record_changes(Change.USER, Change.DELETE, [instance.pk])
+
+
+def commit_horizon(connection):
+    """
+    On PostgreSQL, the oldest transaction id still running, below which every
+    transaction has ended, and the id of the current transaction if it wrote
+    anything. None on other databases.
+    """
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT txid_snapshot_xmin(txid_current_snapshot()), txid_current_if_assigned()"
+        )
+        return cursor.fetchone()
+
+
+def changes_after(changes, since):
+    """
+    The changes of the queryset after the one numbered since, in an order no change
+    committed later can be inserted into.
+    """
+    connection = connections[changes.db]
+    horizon = commit_horizon(connection)
+    if horizon is not None:
+        xmin, own = horizon
+        ended = Q(txid__lt=xmin)
+        if own is not None:
+            # A transaction reads its own changes (as the tests do).
+            ended |= Q(txid=own)
+        changes = changes.filter(ended)
+        last = changes.filter(seq=since).values_list("txid", flat=True).first()
+        if last is not None:
+            changes = changes.filter(Q(txid=last, seq__gt=since) | Q(txid__gt=last))
+        else:
+            changes = changes.filter(seq__gt=since)
+        return changes.order_by("txid", "seq")
+
+    if connection.vendor != "sqlite" and settings.CHANGES_SETTLE_SECONDS:
+        settled = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+        changes = changes.filter(created_at__lte=settled)
+    return changes.filter(seq__gt=since).order_by("seq")
+
+
+def current_objects(changes):
+    """
+    The current comments and users of changes, as {model: {id: object}}, one query
+    per model (and shard), and one more for archived comments. Deleted objects and
+    staff users are missing.
+    """
+    ids = {Change.COMMENT: set(), Change.USER: set()}
+    for change in changes:
+        ids[change.model].add(change.object_id)
+    comments = in_bulk(Comments.objects.all(), ids[Change.COMMENT])
+    archived = ids[Change.COMMENT] - comments.keys()
+    if archived:
+        comments.update(in_bulk(ArchivedComment.objects.all(), archived))
+    return {
+        Change.COMMENT: comments,
+        Change.USER: User.objects.exclude(is_staff=True).in_bulk(ids[Change.USER]),
+    }
@@ -0,0 +1,326 @@
+"""
+Deletion of users and comments in bounded batches.
+
+Deleting a user cascades to all their comments and archived comments, and deleting
+a comment sets the reply of all its replies to NULL. Up to DELETION_BATCH_SIZE rows
+are deleted right away, a user's comments in bulk. When that's more, the object is
+marked (users are deactivated, comments hidden) and a DeletionJob is queued instead.
+The worker then detaches replies and deletes comments batch by batch, each batch in
+its own short transaction, keeping the user counters and the change log in sync.
+
+Jobs are run by a background thread of the web process, woken when a job is queued,
+or by the process_deletions command.
+"""
+
+import logging
+import threading
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .changes import record_changes
+from .hot import start_threads
+from .models import ArchivedComment, Change, Comments, DeletionJob, ThreadActivity, UserStats
+from .sharding import shard_for, shards
+from .stats import adjust_stats
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "commentsapp.deletion.job"
+
+
+def job_token(job):
+    """A token to follow job with, also once its user is deactivated and can't log in."""
+    return signing.dumps(job.pk, salt=TOKEN_SALT)
+
+
+def job_id_for_token(token):
+    """The id of the job of token, None when it's not valid."""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def schedule_deletion(instance):
+    """
+    Delete instance right away if it's small enough, otherwise queue a DeletionJob.
+    Returns the job, or None when instance was deleted.
+    """
+    batch_size = settings.DELETION_BATCH_SIZE
+    if isinstance(instance, User):
+        # A user's comments, and archived comments, are on every shard.
+        dependants = [Comments.objects.using(alias).filter(user=instance) for alias in shards()]
+        archived = [
+            ArchivedComment.objects.using(alias).filter(user=instance) for alias in shards()
+        ]
+        model, owner_id = DeletionJob.USER, instance.pk
+    else:
+        dependants = [Comments.objects.using(instance._state.db).filter(reply=instance)]
+        archived = []
+        model, owner_id = DeletionJob.COMMENT, instance.user_id
+    rows = sum(rows[: batch_size + 1].count() for rows in dependants + archived)
+    if rows <= batch_size:
+        # In one transaction per database the user has rows on, committed once they're
+        # all deleted, the default database last: if a commit fails, the user is left
+        # to delete again.
+        aliases = shards() if model == DeletionJob.USER else [None]
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            if model == DeletionJob.USER:
+                # In bulk: the cascade would adjust the counters and log the changes
+                # one comment at a time.
+                for alias in aliases:
+                    delete_user_comments(instance.pk, alias, batch_size)
+            instance.delete()
+        return None
+
+    with transaction.atomic():
+        if model == DeletionJob.USER:
+            # Deactivated users can't log in or get tokens anymore.
+            instance.is_active = False
+            instance.save(update_fields=["is_active"])
+            stats = UserStats.objects.filter(user=instance).first()
+            # The counter includes the archived comments.
+            total = stats.comments_count if stats else sum(r.count() for r in dependants + archived)
+        else:
+            # Hidden and read-only until it's deleted.
+            instance.pending_deletion = True
+            instance.save(update_fields=["pending_deletion"])
+            total = dependants[0].count()
+        job = DeletionJob.objects.create(
+            model=model, object_id=instance.pk, owner_id=owner_id, total=total
+        )
+        transaction.on_commit(wake_worker)
+    return job
+
+
+def _detach_replies(comment_ids, batch_size, job=None, using=None):
+    """Set reply to NULL on the replies to comment_ids, batch_size replies at a time."""
+    comments = Comments.objects.using(using)
+    while True:
+        with transaction.atomic(using=using):
+            reply_ids = list(
+                comments.filter(reply_id__in=comment_ids).values_list("id", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not reply_ids:
+                return
+            _detach(reply_ids, using)
+            if job is not None:
+                job.processed += len(reply_ids)
+                job.save(update_fields=["processed", "updated_at"])
+
+
+def _detach(reply_ids, using=None):
+    replies = Comments.objects.using(using).filter(id__in=reply_ids)
+    _uncount_replies(replies)
+    replies.update(reply=None)
+    start_threads(reply_ids, using)
+    record_changes(Change.COMMENT, Change.UPDATE, reply_ids)
+
+
+def _lock_batch(comment_ids, using=None):
+    """
+    Lock the comments of comment_ids, then detach the replies added to them since
+    they were detached. Later replies wait for the batch to be deleted, and fail.
+    """
+    comments = Comments.objects.using(using)
+    list(comments.select_for_update().filter(id__in=comment_ids).values_list("id"))
+    late = list(comments.filter(reply_id__in=comment_ids).values_list("id", flat=True))
+    if late:
+        _detach(late, using)
+
+
+def _uncount_replies(replies):
+    received = replies.order_by().values_list("reply__user_id").annotate(count=Count("id"))
+    for user_id, count in received:
+        adjust_stats({"user_id": user_id}, replies_received=-count)
+
+
+def _delete_user(job, batch_size):
+    for using in shards():
+        delete_user_comments(job.object_id, using, batch_size, job)
+    User.objects.filter(pk=job.object_id).delete()
+
+
+def delete_user_comments(user_id, using=None, batch_size=None, job=None):
+    """
+    Delete the comments and archived comments of user_id on the database using,
+    batch by batch, counting them as processed by job.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    _delete_user_comments(user_id, batch_size, using, job)
+    _delete_user_archive(user_id, batch_size, using, job)
+
+
+def _delete_user_archive(user_id, batch_size, using, job=None):
+    archive = ArchivedComment.objects.using(using)
+    while True:
+        archived_ids = list(
+            archive.filter(user_id=user_id).order_by("id").values_list("id", flat=True)[
+                :batch_size
+            ]
+        )
+        if not archived_ids:
+            return
+        with transaction.atomic(using=using):
+            archived = archive.filter(id__in=archived_ids)
+            received = (
+                archived.filter(reply_user_id__isnull=False)
+                .order_by()
+                .values_list("reply_user_id")
+                .annotate(count=Count("id"))
+            )
+            for user_id, count in received:
+                adjust_stats({"user_id": user_id}, replies_received=-count)
+            archived._raw_delete(archived.db)
+            record_changes(Change.COMMENT, Change.DELETE, archived_ids)
+            if job is not None:
+                job.processed += len(archived_ids)
+                job.save(update_fields=["processed", "updated_at"])
+
+
+def _delete_user_comments(user_id, batch_size, using, job=None):
+    while True:
+        comment_ids = list(
+            Comments.objects.using(using)
+            .filter(user_id=user_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not comment_ids:
+            return
+        _detach_replies(comment_ids, batch_size, using=using)
+        with transaction.atomic(using=using):
+            _lock_batch(comment_ids, using)
+            comments = Comments.objects.using(using).filter(id__in=comment_ids)
+            _uncount_replies(comments.filter(reply__isnull=False))
+            ThreadActivity.objects.using(using).filter(root_id__in=comment_ids).delete()
+            # The replies are detached and the counters adjusted in bulk above, so
+            # skip the collector and the per-comment signals.
+            comments._raw_delete(comments.db)
+            record_changes(Change.COMMENT, Change.DELETE, comment_ids)
+            if job is not None:
+                job.processed += len(comment_ids)
+                job.save(update_fields=["processed", "updated_at"])
+
+
+def _delete_comment(job, batch_size):
+    using = shard_for(job.object_id)
+    _detach_replies([job.object_id], batch_size, job, using)
+    comment = Comments.objects.using(using).filter(pk=job.object_id).first()
+    if comment is not None:
+        comment.delete()
+
+
+def delete_comments(comments, batch_size=None):
+    """
+    Delete the comments of a queryset batch by batch, each batch in its own
+    transaction. Returns the number of deleted comments.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    using = comments.db
+    deleted, last_id = 0, 0
+    while True:
+        comment_ids = list(
+            comments.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[
+                :batch_size
+            ]
+        )
+        if not comment_ids:
+            return deleted
+        last_id = comment_ids[-1]
+        _detach_replies(comment_ids, batch_size, using=using)
+        with transaction.atomic(using=using):
+            _lock_batch(comment_ids, using)
+            batch = Comments.objects.using(using).filter(id__in=comment_ids)
+            _uncount_replies(batch.filter(reply__isnull=False))
+            written = batch.order_by().values_list("user_id").annotate(count=Count("id"))
+            for user_id, count in written:
+                adjust_stats({"user_id": user_id}, comments_count=-count)
+            ThreadActivity.objects.using(using).filter(root_id__in=comment_ids).delete()
+            deleted += batch._raw_delete(batch.db)
+            record_changes(Change.COMMENT, Change.DELETE, comment_ids)
+
+
+def process_job(job, batch_size=None):
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    try:
+        if job.model == DeletionJob.USER:
+            _delete_user(job, batch_size)
+        else:
+            _delete_comment(job, batch_size)
+    except Exception as e:
+        logger.exception("Deletion job %s failed", job.pk)
+        job.status, job.error = DeletionJob.FAILED, str(e)
+    else:
+        job.status = DeletionJob.DONE
+    job.save(update_fields=["status", "error", "updated_at"])
+
+
+def run_pending_deletions(batch_size=None):
+    """
+    Run queued jobs, and jobs left running by a worker that died. Returns the number
+    of jobs run.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.DELETION_STALE_SECONDS)
+    processed = 0
+    while True:
+        job = (
+            DeletionJob.objects.filter(
+                Q(status=DeletionJob.PENDING) | Q(status=DeletionJob.RUNNING, updated_at__lt=stale)
+            )
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return processed
+        # Claim the job, other workers may be after it too.
+        claimed = DeletionJob.objects.filter(
+            pk=job.pk, status=job.status, updated_at=job.updated_at
+        ).update(status=DeletionJob.RUNNING, updated_at=timezone.now())
+        if claimed:
+            job.refresh_from_db()
+            process_job(job, batch_size)
+            processed += 1
+
+
+class DeletionWorker(threading.Thread):
+    def __init__(self):
+        super().__init__(name="deletion-worker", daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                run_pending_deletions()
+            except Exception:
+                logger.exception("Deletion worker failed")
+            finally:
+                connections.close_all()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    global _worker
+    if not settings.DELETION_WORKER_THREAD:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = DeletionWorker()
+            _worker.start()
+    _worker.wakeup.set()
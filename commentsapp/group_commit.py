@@ -0,0 +1,154 @@
+"""
+Group commit of new comments.
+
+With COMMENT_GROUP_COMMIT set, create() hands the validated comment to a buffer
+instead of saving it. A background thread saves the buffered comments in one
+transaction once GROUP_COMMIT_MAX_ROWS are waiting or GROUP_COMMIT_DELAY
+milliseconds after the first one, so the database does one commit per batch instead
+of one per comment. Each request waits for the commit of its comment and answers
+with its id, so nothing is acknowledged before it's durable, or fails after
+GROUP_COMMIT_TIMEOUT seconds (its comment may still be saved if it was in a batch
+being committed by then).
+
+Comments are inserted in bulk, without the save signals: the counters, the change log
+and the hot threads are updated in the same transaction, once per user, batch and
+thread. When the batch fails to commit, its comments are inserted again each in its
+own transaction, with the ids they were given, so one bad comment only fails its own
+request.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import hot, stats
+from .changes import record_changes
+from .models import Change, Comments
+from .sharding import shard_for
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The comment wasn't saved in time, try again later."
+    default_code = "group_commit_timeout"
+
+
+class PendingWrite:
+    def __init__(self, instance):
+        self.instance = instance
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class GroupCommitBuffer:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, instance):
+        """Save instance with the next batch. Returns it once committed."""
+        self.start()
+        write = PendingWrite(instance)
+        self.queue.put(write)
+        if not write.done.wait(settings.GROUP_COMMIT_TIMEOUT):
+            # Skipped unless its batch is already being committed.
+            write.cancelled = True
+            raise GroupCommitTimeout()
+        if write.error is not None:
+            raise write.error
+        return instance
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="group-commit", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            try:
+                self.flush(batch)
+            except Exception as e:  # pragma: no cover
+                logger.exception("Group commit failed")
+                for write in batch:
+                    write.error = write.error or e
+            finally:
+                for write in batch:
+                    write.done.set()
+                close_old_connections()
+
+    def collect(self):
+        """Wait for a write, then for more until the batch is full or the delay is over."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + settings.GROUP_COMMIT_DELAY / 1000
+        while len(batch) < settings.GROUP_COMMIT_MAX_ROWS:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch):
+        # When sharded, the comments of each shard are committed together.
+        shards = {}
+        for write in batch:
+            if write.cancelled:
+                continue
+            write.instance.assign_id()
+            shards.setdefault(shard_for(write.instance.pk), []).append(write)
+        for using, writes in shards.items():
+            self.commit(writes, using)
+
+    def commit(self, batch, using):
+        # The ids given when sharded, None otherwise.
+        ids = [write.instance.pk for write in batch]
+        try:
+            insert_comments([write.instance for write in batch], using)
+            return
+        except Exception:
+            logger.warning("Group commit of %d comments failed, saving them one by one", len(batch))
+        for write, pk in zip(batch, ids):
+            write.instance.pk = pk
+            write.instance._state.adding = True
+            try:
+                insert_comments([write.instance], using)
+            except Exception as e:
+                write.error = e
+
+
+def insert_comments(comments, using=None):
+    """
+    Insert comments in one transaction and update what their save signals would have,
+    once per user, batch and thread.
+    """
+    manager = Comments.objects.using(using)
+    with transaction.atomic(using=manager.db):
+        if connections[manager.db].features.can_return_rows_from_bulk_insert or all(
+            comment.pk is not None for comment in comments
+        ):
+            manager.bulk_create(comments)
+        else:
+            # SQLite doesn't return the ids of a bulk insert; raw skips the signals.
+            for comment in comments:
+                comment.save_base(raw=True, force_insert=True, using=manager.db)
+        record_changes(Change.COMMENT, Change.CREATE, [comment.pk for comment in comments])
+        stats.comments_created(comments, manager.db)
+        # Last, the thread activity rows are locked until the commit.
+        hot.comments_created(comments)
+
+
+comment_buffer = GroupCommitBuffer()
@@ -0,0 +1,174 @@
+"""
+Hot threads: root comments ranked by their recent activity.
+
+Every new comment in a thread, the root included, adds 2 ** (age / half-life) to its
+activity, so older comments count half as much every HOT_THREADS_HALF_LIFE seconds.
+Instead of decaying every score as time passes, new comments are weighted up by
+2 ** (now / half-life) ("forward decay"), which ranks threads the same way. The
+score is stored as the log2 of that sum, so it doesn't overflow, and only the thread
+a comment is added to is updated.
+
+A comment that becomes a root, when its parent is deleted or it's moved out of its
+thread, starts a thread of its own, scored from the creation times of its comments.
+A root moved into a thread brings its activity along.
+"""
+
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Comments, ThreadActivity
+from .sharding import in_bulk, merged, shard_for
+
+# Upper bound of the depth of reply chains followed to find the root.
+MAX_DEPTH = 1000
+
+
+def now_score():
+    return time.time() / settings.HOT_THREADS_HALF_LIFE
+
+
+def add_activity(score, added):
+    """log2(2 ** score + 2 ** added), without computing the powers."""
+    high, low = max(score, added), min(score, added)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def decayed(score):
+    """Current activity of a score: the comments' weights, halved once per half-life."""
+    return 2 ** (score - now_score())
+
+
+def find_root(comment):
+    comments = Comments.objects.using(comment._state.db)
+    comment_id, reply_id = comment.pk, comment.reply_id
+    for _ in range(MAX_DEPTH):
+        if reply_id is None:
+            break
+        comment_id = reply_id
+        reply_id = comments.filter(pk=reply_id).values_list("reply_id", flat=True).first()
+    return comment_id
+
+
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_activity(find_root(instance))
+        return
+    # Set by stats.comment_pre_save().
+    previous_reply_id = getattr(instance, "_previous_reply_id", None)
+    if previous_reply_id == instance.reply_id:
+        return
+    using = instance._state.db
+    if instance.reply_id is None:
+        start_threads([instance.pk], using)
+    elif previous_reply_id is None:
+        activity = ThreadActivity.objects.using(using).filter(root_id=instance.pk).first()
+        if activity is not None:
+            activity.delete()
+            record_activity(find_root(instance), activity.score)
+
+
+def comment_pre_delete(sender, instance, **kwargs):
+    # The replies become roots (SET_NULL) once the comment is deleted.
+    replies = Comments.objects.using(instance._state.db).filter(reply_id=instance.pk)
+    instance._reply_ids = list(replies.values_list("id", flat=True))
+
+
+def comment_deleted(sender, instance, **kwargs):
+    if getattr(instance, "_reply_ids", None):
+        start_threads(instance._reply_ids, instance._state.db)
+
+
+def comments_created(comments):
+    """
+    The activity of comments inserted in bulk, one update per thread, in root_id order
+    so concurrent batches lock the threads in the same order.
+    """
+    roots, counts = {}, Counter()
+    for comment in comments:
+        if comment.reply_id is None:
+            counts[comment.pk] += 1
+            continue
+        if comment.reply_id not in roots:
+            roots[comment.reply_id] = find_root(comment)
+        counts[roots[comment.reply_id]] += 1
+    score = now_score()
+    for root_id in sorted(counts):
+        # add_activity() of score, once per comment.
+        record_activity(root_id, score + math.log2(counts[root_id]))
+
+
+def record_activity(root_id, score=None):
+    score = now_score() if score is None else score
+    using = shard_for(root_id)
+    with transaction.atomic(using=using):
+        threads = ThreadActivity.objects.using(using)
+        activity = threads.select_for_update().filter(root_id=root_id).first()
+        if activity is None:
+            threads.create(root_id=root_id, score=score)
+        else:
+            activity.score = add_activity(activity.score, score)
+            activity.save(update_fields=["score"])
+
+
+def thread_scores(root_ids, using=None):
+    """
+    Scores of the threads of root_ids from the creation times of their comments, as
+    {root_id: score}, one query per level of replies. Missing comments are skipped.
+    """
+    comments = Comments.objects.using(using)
+    half_life = settings.HOT_THREADS_HALF_LIFE
+    scores, level = {}, {}
+    for pk, created_at in comments.filter(id__in=root_ids).values_list("id", "created_at"):
+        scores[pk] = created_at.timestamp() / half_life
+        level[pk] = pk
+    for _ in range(MAX_DEPTH):
+        if not level:
+            break
+        replies = comments.filter(reply_id__in=level).values_list("id", "reply_id", "created_at")
+        next_level = {}
+        for pk, reply_id, created_at in replies:
+            root_id = next_level[pk] = level[reply_id]
+            scores[root_id] = add_activity(scores[root_id], created_at.timestamp() / half_life)
+        level = next_level
+    return scores
+
+
+def start_threads(root_ids, using=None):
+    """Give the comments of root_ids, which have just become roots, their activity."""
+    scores = thread_scores(root_ids, using)
+    ThreadActivity.objects.using(using).bulk_create(
+        [ThreadActivity(root_id=root_id, score=score) for root_id, score in scores.items()],
+        ignore_conflicts=True,
+    )
+
+
+def hot_threads(limit, after=None):
+    """
+    The hottest root comments with their sorted replies, each with its score as rank.
+    after is the (rank, id) of the last thread of the previous page.
+    """
+    activity = ThreadActivity.objects.order_by("-score", "-root_id")
+    if after is not None:
+        activity = activity.filter(
+            Q(score__lt=after[0]) | Q(score=after[0], root_id__lt=after[1])
+        )
+    # Imported here, this module is imported on startup and the serializers aren't.
+    from .serializers import with_replies
+
+    activity = activity.values_list("root_id", "score")
+    scores = dict(merged(activity, key=lambda row: (-row[1], -row[0]), limit=limit))
+    comments = in_bulk(with_replies(Comments.objects.visible()), scores)
+    threads = []
+    for root_id, score in scores.items():
+        if root_id in comments:
+            comment = comments[root_id]
+            comment.rank, comment.activity = score, decayed(score)
+            threads.append(comment)
+    return threads
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from commentsapp.archive import archive_cold_threads
+
+
+class Command(BaseCommand):
+    help = "Move the threads without new comments for ARCHIVE_AFTER_DAYS to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None)
+        parser.add_argument("--limit", type=int, default=None, help="Most threads to archive.")
+
+    def handle(self, *args, **options):
+        threads, comments = archive_cold_threads(options["days"], options["limit"])
+        self.stdout.write("Archived %s threads, %s comments." % (threads, comments))
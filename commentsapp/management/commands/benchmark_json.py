@@ -0,0 +1,67 @@
+import io
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from commentsapp.parsers import FastJSONParser
+from commentsapp.renderers import FastJSONRenderer, orjson
+
+
+def comment_payload(comments, replies):
+    """A list shaped like the CommentSerializer output."""
+    user = {
+        "id": 1,
+        "email": "test1@gmail.com",
+        "username": "test1",
+        "first_name": "test1_name",
+        "last_name": "test1_surname",
+    }
+    return [
+        {
+            "id": number,
+            "user": 1,
+            "text": "Comment number %s, with some unicode: привіт 👋" % number,
+            "home": "https://google.com",
+            "reply": None,
+            "replies": [
+                {"id": number * 1000 + reply, "user": user, "text": "I agree!", "home": ""}
+                for reply in range(replies)
+            ],
+        }
+        for number in range(comments)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare the stdlib and orjson JSON renderer/parser on a large comment list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument("--replies", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("orjson isn't installed, the fast classes fall back to the stdlib.")
+
+        data = comment_payload(options["comments"], options["replies"])
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            self.stderr.write("Rendered output differs between the renderers!")
+        self.stdout.write(
+            "%s comments, %s replies each, %.1f KB"
+            % (options["comments"], options["replies"], len(body) / 1024)
+        )
+
+        cases = [
+            ("render", JSONRenderer, lambda r: r.render(data)),
+            ("render", FastJSONRenderer, lambda r: r.render(data)),
+            ("parse", JSONParser, lambda p: p.parse(io.BytesIO(body))),
+            ("parse", FastJSONParser, lambda p: p.parse(io.BytesIO(body))),
+        ]
+        for operation, cls, run in cases:
+            instance = cls()
+            best = min(timeit.repeat(lambda: run(instance), number=1, repeat=options["repeat"]))
+            self.stdout.write("%-7s %-17s %8.2f ms" % (operation, cls.__name__, best * 1000))
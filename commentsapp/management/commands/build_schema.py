@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from dzencodeproject.schema import build_schema_files
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema served at /schema/ into SCHEMA_DIR."
+
+    def handle(self, *args, **options):
+        for path in build_schema_files():
+            self.stdout.write("Wrote %s" % path)
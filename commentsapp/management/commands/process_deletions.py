@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from commentsapp.deletion import run_pending_deletions
+
+
+class Command(BaseCommand):
+    help = "Run the queued user and comment deletions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new jobs instead of exiting."
+        )
+        parser.add_argument("--interval", type=float, default=5, help="Seconds between polls.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = run_pending_deletions(batch_size=options["batch_size"])
+            if processed:
+                self.stdout.write("Ran %s deletion jobs." % processed)
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,80 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a new interpreter, so nothing is imported yet.
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+ready = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({"setup": ready - start, "urls": time.perf_counter() - ready}))
+"""
+
+# "import time:  self [us] |  cumulative | imported package", indented by nesting.
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_import_times(output):
+    """(module, self ms, cumulative ms, depth) of every module in -X importtime output."""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, int(own) / 1000, int(cumulative) / 1000, len(indent) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = "Profile the startup: time of django.setup(), of the URLconf and of each import."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Slowest imports listed.")
+        parser.add_argument(
+            "--fast-boot", action="store_true", help="Profile a startup with FAST_BOOT set."
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options["fast_boot"]:
+            env["FAST_BOOT"] = "1"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            cwd=settings.BASE_DIR,
+            env=env,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError("Startup failed:\n%s" % result.stderr[-2000:])
+        times = json.loads(result.stdout.splitlines()[-1])
+        imports = parse_import_times(result.stderr)
+
+        self.stdout.write("django.setup()  %8.1f ms" % (times["setup"] * 1000))
+        self.stdout.write("URLconf         %8.1f ms" % (times["urls"] * 1000))
+        self.stdout.write(
+            "Imports         %8.1f ms, %d modules"
+            % (sum(own for _, own, _, _ in imports), len(imports))
+        )
+
+        packages = defaultdict(float)
+        for module, own, _, _ in imports:
+            packages[module.split(".")[0]] += own
+        self.stdout.write("\nImport time by package (ms):")
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[: options["limit"]]:
+            self.stdout.write("%8.1f  %s" % (own, package))
+
+        self.stdout.write("\nSlowest imports, with what they import (ms):")
+        slowest = sorted(imports, key=lambda item: -item[2])[: options["limit"]]
+        for module, own, cumulative, depth in slowest:
+            self.stdout.write("%8.1f  %8.1f self  %s%s" % (cumulative, own, "  " * depth, module))
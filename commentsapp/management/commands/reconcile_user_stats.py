@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from commentsapp.stats import reconcile_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user comment counters. Meant to run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        processed = reconcile_user_stats(batch_size=options["batch_size"])
+        self.stdout.write("Reconciled comment counters of %s users." % processed)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from commentsapp.caching import warm_cache
+
+
+class Command(BaseCommand):
+    help = "Cache the comment and user lists, the first pages of hot threads and their threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages", type=int, default=None, help="Hot threads pages, WARM_CACHE_PAGES by default."
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Warmed %s pages." % warm_cache(options["pages"]))
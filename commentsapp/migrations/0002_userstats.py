@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model("auth", "User")
+    Comments = apps.get_model("commentsapp", "Comments")
+    UserStats = apps.get_model("commentsapp", "UserStats")
+
+    comments_count = dict(
+        Comments.objects.order_by().values_list("user_id").annotate(models.Count("id"))
+    )
+    replies_received = dict(
+        Comments.objects.filter(reply__isnull=False)
+        .order_by()
+        .values_list("reply__user_id")
+        .annotate(models.Count("id"))
+    )
+    UserStats.objects.bulk_create(
+        [
+            UserStats(
+                user_id=user_id,
+                comments_count=comments_count.get(user_id, 0),
+                replies_received=replies_received.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list("id", flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('commentsapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='auth.user')),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('replies_received', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:53
+
+import math
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_thread_activity(apps, schema_editor):
+    # Comments have no dates, so existing threads count their replies as of now.
+    Comments = apps.get_model("commentsapp", "Comments")
+    ThreadActivity = apps.get_model("commentsapp", "ThreadActivity")
+
+    now = time.time() / settings.HOT_THREADS_HALF_LIFE
+    roots = (
+        Comments.objects.filter(reply__isnull=True)
+        .annotate(replies_count=models.Count("replies"))
+        .values_list("id", "replies_count")
+    )
+    ThreadActivity.objects.bulk_create(
+        (
+            ThreadActivity(root_id=root_id, score=now + math.log2(1 + replies_count))
+            for root_id, replies_count in roots.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentsapp', '0005_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadActivity',
+            fields=[
+                ('root', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='thread_activity', serialize=False, to='commentsapp.comments')),
+                ('score', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='threadactivity',
+            index=models.Index(fields=['score', 'root'], name='commentsapp_score_7ce1de_idx'),
+        ),
+        migrations.RunPython(backfill_thread_activity, migrations.RunPython.noop),
+    ]
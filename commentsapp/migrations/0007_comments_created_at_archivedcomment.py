@@ -0,0 +1,42 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def partition_archive(apps, schema_editor):
+    from commentsapp.archive import partition_archive
+
+    partition_archive(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('commentsapp', '0006_threadactivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comments',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('home', models.URLField(blank=True)),
+                ('text', models.TextField()),
+                ('reply', models.BigIntegerField(db_index=True, null=True)),
+                ('reply_user_id', models.IntegerField(db_index=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
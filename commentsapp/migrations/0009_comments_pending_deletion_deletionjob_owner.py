@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentsapp', '0008_idsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comments',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deletionjob',
+            name='owner_id',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+def install_commit_order(apps, schema_editor):
+    from commentsapp.changes import install_commit_order
+
+    install_commit_order(schema_editor.connection)
+
+
+def uninstall_commit_order(apps, schema_editor):
+    from commentsapp.changes import uninstall_commit_order
+
+    uninstall_commit_order(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentsapp', '0009_comments_pending_deletion_deletionjob_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['txid', 'seq'], name='commentsapp_txid_7e3f31_idx'),
+        ),
+        migrations.RunPython(install_commit_order, uninstall_commit_order),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentsapp', '0010_change_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idsequence',
+            name='shards',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,171 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from dzencodeproject.db.routers import (
+    is_pinned,
+    pin_to_primary,
+    reset_read_routing,
+    route_reads_to_replicas,
+)
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .serializers import query_list, represent_author
+
+
+def fingerprint(data):
+    """
+    Hash of parsed request data. request.body can't be hashed: it's unavailable once
+    a multipart body was read, e.g. by the CSRF check of session authentication.
+    """
+    if hasattr(data, "lists"):
+        # A QueryDict, of form data.
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def client_key(request):
+    if request.user and request.user.is_authenticated:
+        return "user:%s" % request.user.id
+    return "addr:%s" % request.META.get("REMOTE_ADDR")
+
+
+class ReplicaReadMixin:
+    """
+    Serves replica_actions from the read replicas. A client that wrote something is
+    pinned to the primary for a short while so it always reads its own writes.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        token = route_reads_to_replicas(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            reset_read_routing(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.DATABASE_REPLICAS or self.action not in self.replica_actions:
+            return
+        if not is_pinned(client_key(request)):
+            route_reads_to_replicas()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            pin_to_primary(client_key(request))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class IdempotencyMixin:
+    """
+    create() with an Idempotency-Key header runs once per client and key: the first
+    response is kept in the IDEMPOTENCY_CACHE for IDEMPOTENCY_KEY_SECONDS and replayed
+    to retries, which don't write or hash anything again. A retry arriving while the
+    first request is still running gets 409, one with another body 422. Errors aren't
+    kept, so a corrected request can be sent with the same key.
+    """
+
+    idempotency_header = "Idempotency-Key"
+    # Upper bound of the time a create takes, after which a retry may run it again.
+    idempotency_lock_seconds = 60
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "Idempotency-Key",
+                str,
+                OpenApiParameter.HEADER,
+                description="Retries with the same key get the first response replayed.",
+            )
+        ]
+    )
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(self.idempotency_header)
+        if not key:
+            return super().create(request, *args, **kwargs)
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        cache_key = "idempotency:%s:%s:%s" % (
+            self.basename,
+            client_key(request),
+            hashlib.sha256(key.encode()).hexdigest(),
+        )
+        body = fingerprint(request.data)
+        pending = {"fingerprint": body, "status": None}
+        if not cache.add(cache_key, pending, self.idempotency_lock_seconds):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self.replay(stored, body)
+            # Expired in between.
+            cache.set(cache_key, pending, self.idempotency_lock_seconds)
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 400:
+            cache.delete(cache_key)
+        else:
+            stored = {
+                "fingerprint": body,
+                "status": response.status_code,
+                "data": response.data,
+            }
+            cache.set(cache_key, stored, settings.IDEMPOTENCY_KEY_SECONDS)
+        return response
+
+    def replay(self, stored, fingerprint):
+        if stored["status"] is None:
+            return Response(
+                {"detail": "A request with this Idempotency-Key is in progress."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"detail": "This Idempotency-Key was used with another request body."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(
+            stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"}
+        )
+
+
+class SideloadMixin:
+    """
+    With ?include=users the nested users of a read response are replaced by their ids
+    and returned once each in an "included" map next to the data.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if "users" in query_list(context, "include"):
+            context["included_users"] = {}
+        return context
+
+    def get_included(self, context):
+        """The "included" map of the users collected in context, None without ?include."""
+        included_users = context.get("included_users")
+        if included_users is None:
+            return None
+        return {"users": {user.id: represent_author(user) for user in included_users.values()}}
+
+    def sideload(self, response, serializer):
+        included = self.get_included(serializer.context)
+        if included is None:
+            return response
+        if isinstance(response.data, dict) and "results" in response.data:
+            response.data["included"] = included
+        else:
+            response.data = {"data": response.data, "included": included}
+        return response
@@ -1,5 +1,24 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
+
+
+class CommentQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        The comments, without those being deleted in the background: marked for
+        deletion, or of a deactivated user.
+        """
+        return self.filter(pending_deletion=False, user__is_active=True)
+
+    def create(self, **kwargs):
+        # Unlike QuerySet.create(), leave the database to the router unless it was
+        # chosen: when sharded it depends on the id the comment gets on save.
+        comment = self.model(**kwargs)
+        self._for_write = True
+        comment.save(force_insert=True, using=self._db)
+        return comment
 
 
 class Comments(models.Model):
@@ -7,3 +26,141 @@ class Comments(models.Model):
     home = models.URLField(blank=True)
     text = models.TextField()
     reply = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, related_name="replies")
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    # Set while a DeletionJob detaches the replies, hiding the comment until it's gone.
+    pending_deletion = models.BooleanField(default=False, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    def assign_id(self):
+        """Give a new comment its id ahead of saving it, when sharded (see sharding.py)."""
+        if self.pk is None and settings.COMMENT_SHARDS:
+            from .sharding import new_comment_id
+
+            self.pk = new_comment_id(self.reply_id)
+
+    def save(self, *args, **kwargs):
+        self.assign_id()
+        super().save(*args, **kwargs)
+
+
+class UserStats(models.Model):
+    """
+    Comment counters of a user, kept up to date on write (see stats.py) and
+    recomputed by the reconcile_user_stats command.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    comments_count = models.PositiveIntegerField(default=0)
+    replies_received = models.PositiveIntegerField(default=0)
+
+
+class DeletionJob(models.Model):
+    """
+    A user or comment too large to delete within a request, deleted in batches by
+    the background worker (see deletion.py).
+    """
+
+    USER = "user"
+    COMMENT = "comment"
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    model = models.CharField(max_length=10, choices=[(USER, "User"), (COMMENT, "Comment")])
+    object_id = models.BigIntegerField()
+    status = models.CharField(
+        max_length=10,
+        default=PENDING,
+        choices=[(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")],
+    )
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # The deleted user, or the author of the deleted comment, who can follow the job.
+    # Not a foreign key: the job outlives them.
+    owner_id = models.IntegerField(null=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "updated_at"])]
+
+
+class Change(models.Model):
+    """
+    Append-only log of the writes to Comments and User, in seq order, read by sync
+    clients through /changes/ (see changes.py).
+    """
+
+    COMMENT = "comment"
+    USER = "user"
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=10, choices=[(COMMENT, "Comment"), (USER, "User")])
+    object_id = models.BigIntegerField()
+    action = models.CharField(
+        max_length=10, choices=[(CREATE, "Create"), (UPDATE, "Update"), (DELETE, "Delete")]
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Id of the transaction that logged the change, set by a trigger on PostgreSQL.
+    txid = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["txid", "seq"])]
+
+
+class ThreadActivity(models.Model):
+    """
+    Time-decayed activity score of a root comment and its replies, kept up to date
+    on every new comment and read by the hot threads feed (see hot.py).
+    """
+
+    root = models.OneToOneField(
+        Comments, on_delete=models.CASCADE, primary_key=True, related_name="thread_activity"
+    )
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["score", "root"])]
+
+
+class ArchivedComment(models.Model):
+    """
+    A comment of a thread that saw no activity for ARCHIVE_AFTER_DAYS, moved out of
+    Comments with the rest of its thread (see archive.py). Partitioned by created_at
+    on PostgreSQL.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    home = models.URLField(blank=True)
+    text = models.TextField()
+    # Threads are archived whole, so the replied comment is archived too.
+    reply = models.BigIntegerField(null=True, db_index=True)
+    # Author of the replied comment, for the replies_received counter.
+    reply_user_id = models.IntegerField(null=True, db_index=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def replies(self):
+        return ArchivedComment.objects.filter(reply=self.id)
+
+
+class IdSequence(models.Model):
+    """
+    Next value of a sequence shared by the shards, handed out a block at a time (see
+    sharding.py). Stored in the default database.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+    # Number of databases the ids of the sequence encode the shard for.
+    shards = models.PositiveIntegerField(null=True)
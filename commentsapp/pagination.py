@@ -0,0 +1,124 @@
+from base64 import b64decode, b64encode
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .changes import changes_after
+
+
+class SearchPagination:
+    """
+    Cursor pagination over search results and hot threads, which are ordered by
+    (rank, id) and so can't use DRF's CursorPagination. The cursor is the (rank, id)
+    of the last result of the previous page.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate(self, request, search):
+        """search(limit, after) returns at most limit results following the cursor."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        results = search(page_size + 1, self.decode_cursor(request))
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            rank, _, pk = b64decode(encoded.encode("ascii")).decode("ascii").partition(":")
+            return float(rank), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, result):
+        return b64encode(("%r:%s" % (result.rank, result.pk)).encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class ChangePagination(BasePagination):
+    """
+    Pages of the change log after ?since=<seq>. The response's last_seq is the since
+    of the next poll, also when there's nothing new yet.
+    """
+
+    since_query_param = "since"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    get_page_size = SearchPagination.get_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.since = int(request.query_params.get(self.since_query_param, 0))
+        except ValueError:
+            raise ValidationError({self.since_query_param: ["A valid integer is required."]})
+        page_size = self.get_page_size(request)
+        changes = list(changes_after(queryset, self.since)[: page_size + 1])
+        self.has_next = len(changes) > page_size
+        self.page = changes[:page_size]
+        return self.page
+
+    def get_last_seq(self):
+        return self.page[-1].seq if self.page else self.since
+
+    def get_paginated_response(self, data):
+        next_link = None
+        if self.has_next:
+            next_link = replace_query_param(
+                self.request.build_absolute_uri(), self.since_query_param, self.get_last_seq()
+            )
+        return Response({"next": next_link, "last_seq": self.get_last_seq(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "last_seq": {"type": "integer"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.since_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Return the changes after this seq.",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of changes to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -14,6 +14,17 @@ class IsOwnerOrAuthenticatedOrPost(BasePermission):
         return bool(request.user and (request.method in SAFE_METHODS or obj.id == request.user.id))
 
 
+class IsAuthenticatedOrJobToken(BasePermission):
+    """
+    The request is authenticated as a user, or reads a deletion job with its token.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return True
+        return view.action == "retrieve" and "token" in request.query_params
+
+
 class IsOwnerOrAuthenticated(BasePermission):
     """
     The request is authenticated as a comment owner, or is a read-only request.
@@ -0,0 +1,217 @@
+"""
+Full-text search over Comments.text.
+
+PostgreSQL keeps a generated tsvector column with a GIN index, SQLite an external
+content FTS5 table kept in sync by triggers. Both are maintained by the database
+itself, so bulk writes stay indexed too. Other databases fall back to an unindexed
+icontains scan.
+
+Highlights are HTML: the comment text escaped, with the matches in <mark> tags. The
+database marks the matches with control characters, which are only replaced by the
+tags once the text is escaped.
+"""
+
+import heapq
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Comments
+
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+HEADLINE_OPTIONS = 'StartSel="%s", StopSel="%s", HighlightAll=TRUE' % (
+    HIGHLIGHT_START,
+    HIGHLIGHT_STOP,
+)
+
+TABLE = Comments._meta.db_table
+USER_TABLE = User._meta.db_table
+FTS_TABLE = TABLE + "_fts"
+
+POSTGRESQL_INDEX = [
+    "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED",
+    "CREATE INDEX IF NOT EXISTS {table}_search_vector ON {table} USING GIN (search_vector)",
+]
+
+SQLITE_TRIGGERS = {
+    FTS_TABLE + "_insert": (
+        "CREATE TRIGGER {name} AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END"
+    ),
+    FTS_TABLE + "_delete": (
+        "CREATE TRIGGER {name} AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); END"
+    ),
+    FTS_TABLE + "_update": (
+        "CREATE TRIGGER {name} AFTER UPDATE OF text ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); "
+        "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END"
+    ),
+}
+
+
+def install_search_index(connection):
+    """
+    Create the search index if it's missing. Idempotent, and also run after every
+    migrate because SQLite table rebuilds drop the triggers.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for statement in POSTGRESQL_INDEX:
+                cursor.execute(statement.format(table=TABLE))
+        elif connection.vendor == "sqlite":
+            if TABLE not in connection.introspection.table_names(cursor):
+                return
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5"
+                "(text, content='{table}', content_rowid='id')".format(fts=FTS_TABLE, table=TABLE)
+            )
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = set(SQLITE_TRIGGERS) - existing
+            for name in missing:
+                cursor.execute(SQLITE_TRIGGERS[name].format(name=name, table=TABLE, fts=FTS_TABLE))
+            if missing:
+                # Writes made while the triggers were missing aren't indexed.
+                cursor.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=FTS_TABLE))
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("ALTER TABLE %s DROP COLUMN IF EXISTS search_vector" % TABLE)
+        elif connection.vendor == "sqlite":
+            for name in SQLITE_TRIGGERS:
+                cursor.execute("DROP TRIGGER IF EXISTS %s" % name)
+            cursor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+
+
+def highlight_html(highlighted):
+    """The text highlighted by the database as HTML, escaped but for the <mark> tags."""
+    return (
+        escape(highlighted)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def _fts_terms(query):
+    # Quote every word, so user input can't be read as FTS5 query syntax.
+    return " ".join('"%s"' % word for word in re.findall(r"\w+", query))
+
+
+def filter_comments(queryset, query):
+    """Restrict a Comments queryset to the comments matching query, using the index."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return queryset.extra(
+            where=["%s.search_vector @@ websearch_to_tsquery('simple', %%s)" % TABLE],
+            params=[query],
+        )
+    if vendor == "sqlite":
+        terms = _fts_terms(query)
+        if not terms:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(
+                "SELECT rowid FROM {fts} WHERE {fts} MATCH %s".format(fts=FTS_TABLE), [terms]
+            )
+        )
+    return queryset.filter(text__icontains=query)
+
+
+def search_comments(query, limit, after=None):
+    """
+    Comments matching query, best match first, with a rank and a highlighted text.
+
+    after is the (rank, id) of the last comment of the previous page. Highlights are
+    only computed for the returned page. When sharded, every shard is searched and
+    the best matches of all are returned.
+    """
+    aliases = settings.COMMENT_SHARDS or [router.db_for_read(Comments)]
+    pages = [_search_comments(alias, query, limit, after) for alias in aliases]
+    return list(islice(heapq.merge(*pages, key=lambda c: (-c.rank, -c.id)), limit))
+
+
+def _search_comments(alias, query, limit, after):
+    vendor = connections[alias].vendor
+    manager = Comments.objects.db_manager(alias)
+    cursor_filter, cursor_params = "", []
+    if after is not None:
+        cursor_filter = "AND (rank < %s OR (rank = %s AND id < %s))"
+        cursor_params = [after[0], after[0], after[1]]
+
+    if vendor == "postgresql":
+        comments = list(
+            manager.raw(
+                "SELECT page.*, ts_headline('simple', page.text, query, %s) AS highlight"
+                " FROM websearch_to_tsquery('simple', %s) query, ("
+                "  SELECT * FROM ("
+                "   SELECT c.id, c.user_id, c.home, c.text, c.reply_id,"
+                # real, as float8 to compare with the cursor's rank unchanged.
+                "    ts_rank(c.search_vector, query)::float8 AS rank"
+                "   FROM {table} c JOIN {users} u ON u.id = c.user_id,"
+                "    websearch_to_tsquery('simple', %s) query"
+                "   WHERE c.search_vector @@ query AND NOT c.pending_deletion AND u.is_active"
+                "  ) matches WHERE TRUE {cursor_filter} ORDER BY rank DESC, id DESC LIMIT %s"
+                " ) page ORDER BY rank DESC, id DESC".format(
+                    table=TABLE, users=USER_TABLE, cursor_filter=cursor_filter
+                ),
+                [
+                    HEADLINE_OPTIONS,
+                    query,
+                    query,
+                    *cursor_params,
+                    limit,
+                ],
+            )
+        )
+        for comment in comments:
+            comment.highlight = highlight_html(comment.highlight)
+        return comments
+
+    if vendor == "sqlite":
+        terms = _fts_terms(query)
+        if not terms:
+            return []
+        comments = list(
+            manager.raw(
+                "SELECT * FROM ("
+                " SELECT c.id, c.user_id, c.home, c.text, c.reply_id, -bm25({fts}) AS rank"
+                " FROM {fts} JOIN {table} c ON c.id = {fts}.rowid"
+                " JOIN {users} u ON u.id = c.user_id"
+                " WHERE {fts} MATCH %s AND NOT c.pending_deletion AND u.is_active"
+                ") WHERE 1 {cursor_filter} ORDER BY rank DESC, id DESC LIMIT %s".format(
+                    table=TABLE, fts=FTS_TABLE, users=USER_TABLE, cursor_filter=cursor_filter
+                ),
+                [terms, *cursor_params, limit],
+            )
+        )
+        if comments:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    "SELECT rowid, highlight({fts}, 0, %s, %s) FROM {fts}"
+                    " WHERE {fts} MATCH %s AND rowid IN ({ids})".format(
+                        fts=FTS_TABLE, ids=", ".join("%s" for _ in comments)
+                    ),
+                    [HIGHLIGHT_START, HIGHLIGHT_STOP, terms, *(c.id for c in comments)],
+                )
+                highlights = dict(cursor.fetchall())
+            for comment in comments:
+                comment.highlight = highlight_html(highlights.get(comment.id, comment.text))
+        return comments
+
+    comments = manager.visible().filter(text__icontains=query).order_by("-id")
+    if after is not None:
+        comments = comments.filter(id__lt=after[1])
+    comments = list(comments[:limit])
+    for comment in comments:
+        comment.rank, comment.highlight = 0.0, highlight_html(comment.text)
+    return comments
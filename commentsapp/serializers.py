@@ -1,11 +1,93 @@
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
-from .models import Comments
+from .deletion import job_token
+from .models import ArchivedComment, Change, Comments, DeletionJob
+from .sharding import shard_for
 
 
-class UserSerializer(serializers.ModelSerializer):
+def query_list(context, name):
+    """Comma separated values of the ?name= query parameter of a read request."""
+    request = context.get("request")
+    if request is None or request.method not in SAFE_METHODS:
+        return set()
+    return set(filter(None, request.query_params.get(name, "").split(",")))
+
+
+# The public fields of a user, as UserSerializer returns them.
+AUTHOR_FIELDS = ("id", "email", "username", "first_name", "last_name")
+# The columns read for the comments and replies returned with their users.
+COMMENT_COLUMNS = ("id", "user", "text", "home", "reply") + tuple(
+    "user__%s" % name for name in AUTHOR_FIELDS
+)
+
+
+def represent_author(user):
+    return {name: getattr(user, name) for name in AUTHOR_FIELDS}
+
+
+def represent_user(user, context):
+    """
+    The user nested in a comment, built once per response, or only its id when the
+    request side-loads users into the "included" map.
+    """
+    included = context.get("included_users")
+    if included is not None:
+        included.setdefault(user.id, user)
+        return user.id
+    authors = context.setdefault("authors", {})
+    if user.id not in authors:
+        authors[user.id] = represent_author(user)
+    return authors[user.id]
+
+
+def sorted_replies(comment):
+    replies = comment.replies
+    if replies.model is Comments:
+        replies = replies.visible()
+    return replies.select_related("user").only(*COMMENT_COLUMNS).order_by("-id")
+
+
+def with_replies(queryset):
+    """
+    Comments of queryset with their users and sorted replies loaded in two queries,
+    instead of one per comment in CommentSerializer.
+    """
+    replies = Comments.objects.visible().select_related("user").only(*COMMENT_COLUMNS)
+    replies = replies.order_by("-id")
+    return (
+        queryset.select_related("user")
+        .only(*COMMENT_COLUMNS)
+        .prefetch_related(Prefetch("replies", queryset=replies))
+    )
+
+
+class SparseFieldsetMixin:
+    """
+    Returns only the fields listed in ?fields=id,text when serializing the response
+    of a read request. Unknown field names are ignored.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        is_root = self.root is self or (
+            self.parent is self.root and isinstance(self.root, serializers.ListSerializer)
+        )
+        requested = query_list(self.context, "fields") if is_root else None
+        if requested:
+            for name in set(fields) - requested:
+                fields.pop(name)
+        return fields
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     password = serializers.CharField(max_length=30, write_only=True)
     confirm = serializers.CharField(max_length=30, write_only=True)
     email = serializers.EmailField()
@@ -36,24 +118,155 @@ class UserSerializer(serializers.ModelSerializer):
         return data
 
 
+class UserDetailSerializer(UserSerializer):
+    comments_count = serializers.IntegerField(
+        source="stats.comments_count", default=0, read_only=True
+    )
+    replies_received = serializers.IntegerField(
+        source="stats.replies_received", default=0, read_only=True
+    )
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["comments_count", "replies_received"]
+
+
+@extend_schema_field(UserSerializer)
+class UserField(serializers.RelatedField):
+    def to_representation(self, value):
+        return represent_user(value, self.context)
+
+
+class ShardedRelatedField(serializers.PrimaryKeyRelatedField):
+    """A related object by id. Comments are looked up on the shard of their thread."""
+
+    def to_internal_value(self, data):
+        queryset = self.get_queryset()
+        if queryset.model is Comments:
+            # Comments marked for deletion can't be replied to.
+            queryset = queryset.visible()
+            if str(data).isdigit():
+                queryset = queryset.using(shard_for(int(data)))
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            return queryset.get(pk=data)
+        except ObjectDoesNotExist:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
 class ReplySerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = UserField(read_only=True)
 
     class Meta:
         model = Comments
         fields = ("id", "user", "text", "home")
 
 
-class CommentSerializer(serializers.ModelSerializer):
-    replies = ReplySerializer(many=True, read_only=True)
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    serializer_related_field = ShardedRelatedField
+    replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comments
         fields = ("id", "user", "text", "home", "reply", "replies")
         read_only_fields = ("id", "user")
 
+    @cached_property
+    def reply_serializer(self):
+        return ReplySerializer(context=self.context)
+
+    def validate(self, attrs):
+        reply = attrs.get("reply")
+        # A comment's id encodes the shard of its thread, so it can't move to another.
+        if self.instance is not None and reply is not None:
+            if shard_for(reply.pk) != shard_for(self.instance.pk):
+                raise serializers.ValidationError(
+                    {"reply": ["A comment can't be moved to a thread on another shard."]}
+                )
+        return attrs
+
+    @extend_schema_field(ReplySerializer(many=True))
+    def get_replies(self, instance):
+        # Prefetched replies are already sorted (see with_replies).
+        if "replies" in getattr(instance, "_prefetched_objects_cache", {}):
+            replies = instance.replies.all()
+        else:
+            replies = sorted_replies(instance)
+        return [self.reply_serializer.to_representation(reply) for reply in replies]
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        sorted_replies = instance.replies.all().order_by("-id")
-        representation["replies"] = ReplySerializer(sorted_replies, many=True).data
+        if "user" in representation and "user" in query_list(self.context, "expand"):
+            representation["user"] = represent_user(instance.user, self.context)
         return representation
+
+
+class ArchivedCommentSerializer(CommentSerializer):
+    class Meta(CommentSerializer.Meta):
+        model = ArchivedComment
+
+
+class HotThreadSerializer(CommentSerializer):
+    activity = serializers.FloatField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ("activity",)
+
+
+class CommentSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+    highlight = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Comments
+        fields = ("id", "user", "text", "home", "reply", "rank", "highlight")
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeletionJob
+        fields = ("id", "model", "object_id", "status", "total", "processed", "created_at")
+
+
+class ScheduledDeletionJobSerializer(DeletionJobSerializer):
+    """A job just queued, with the token to follow it at /deletions/{id}/?token=."""
+
+    token = serializers.SerializerMethodField()
+
+    class Meta(DeletionJobSerializer.Meta):
+        fields = DeletionJobSerializer.Meta.fields + ("token",)
+
+    def get_token(self, instance) -> str:
+        return job_token(instance)
+
+
+class FlatCommentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Comments
+        fields = ("id", "user", "text", "home", "reply")
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """
+    data is the current state of the object, as the users and comments endpoints
+    return it, or null once it's deleted. It's read from context["objects"].
+    """
+
+    data = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Change
+        fields = ("seq", "model", "object_id", "action", "created_at", "data")
+
+    @cached_property
+    def data_serializers(self):
+        return {Change.COMMENT: FlatCommentSerializer(), Change.USER: UserSerializer()}
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_data(self, change):
+        instance = self.context["objects"][change.model].get(change.object_id)
+        if instance is None:
+            return None
+        return self.data_serializers[change.model].to_representation(instance)
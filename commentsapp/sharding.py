@@ -0,0 +1,164 @@
+"""
+Sharded comment storage.
+
+With DB_SHARD_HOSTS set, COMMENT_SHARDS lists the default database and the shards.
+Each thread, a root comment and all its replies, is stored on one of them with its
+activity and archive, so thread reads and writes only touch one database. Users,
+their counters, the change log and the deletion jobs stay in the default database.
+
+Comment ids come from a sequence in the default database that each process reserves
+COMMENT_ID_BLOCK_SIZE numbers of at a time, and encode the shard: a new root comment
+with number n gets the id n * shards + n % shards, and a reply gets the remainder of
+the comment it replies to. Every comment of a thread is thus on shard id % shards,
+known from any of its ids (see dzencodeproject.db.routers.ShardRouter), and ids stay
+unique and increasing within a process, so -id is still roughly newest first. The
+sequence records the number of databases: with another one, existing comments would
+be looked up on the wrong shard, so ids aren't handed out and /ready/ fails.
+
+Queries spanning the shards (lists, search, hot threads) run on every shard and
+merge the results in their order. Users are copied to every shard when they're saved
+in the default database, and to a shard when it's migrated.
+"""
+
+import heapq
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max
+from dzencodeproject.db.routers import shard_for
+
+from .models import Comments, IdSequence
+
+SEQUENCE = "comments"
+
+_ids = iter(())
+_ids_lock = threading.Lock()
+
+
+def shards():
+    """The comment shards, or [None] (routed as usual) without sharding."""
+    return settings.COMMENT_SHARDS or [None]
+
+
+def check_shard_count():
+    """
+    Raise ImproperlyConfigured when the comment ids were handed out for another number
+    of databases than COMMENT_SHARDS.
+    """
+    count = (
+        IdSequence.objects.using(DEFAULT_DB_ALIAS)
+        .filter(name=SEQUENCE)
+        .values_list("shards", flat=True)
+        .first()
+    )
+    databases = len(settings.COMMENT_SHARDS)
+    if count is not None and count != databases:
+        raise ImproperlyConfigured(
+            "Comment ids encode the shard among %d databases, but there are %d: existing "
+            "comments would be looked up on the wrong shard." % (count, databases)
+        )
+
+
+def allocate_ids(count):
+    """Reserve count numbers of the sequence. Returns them as a range."""
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequences = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+        if not sequences.filter(name=SEQUENCE).update(next_value=F("next_value") + count):
+            # Start above the ids of the comments that exist already.
+            last = max(
+                Comments.objects.using(alias).aggregate(last=Max("id"))["last"] or 0
+                for alias in shards()
+            )
+            start = last // len(shards()) + 1
+            sequences.get_or_create(
+                name=SEQUENCE, defaults={"next_value": start, "shards": len(shards())}
+            )
+            sequences.filter(name=SEQUENCE).update(next_value=F("next_value") + count)
+        # Sequences created before the number was recorded were for these databases.
+        sequences.filter(name=SEQUENCE, shards__isnull=True).update(shards=len(shards()))
+        check_shard_count()
+        end = sequences.get(name=SEQUENCE).next_value
+    return range(end - count, end)
+
+
+def next_number():
+    global _ids
+    with _ids_lock:
+        number = next(_ids, None)
+        if number is None:
+            _ids = iter(allocate_ids(settings.COMMENT_ID_BLOCK_SIZE))
+            number = next(_ids)
+    return number
+
+
+def new_comment_id(reply_id=None):
+    count = len(settings.COMMENT_SHARDS)
+    number = next_number()
+    shard = (number if reply_id is None else reply_id) % count
+    return number * count + shard
+
+
+def by_shard(ids):
+    """ids grouped by the shard of their thread, as {alias: [id]}."""
+    groups = {}
+    for pk in ids:
+        groups.setdefault(shard_for(pk), []).append(pk)
+    return groups
+
+
+def in_bulk(queryset, ids):
+    """queryset.in_bulk(ids) of comments, on the shard of each id."""
+    comments = {}
+    for alias, shard_ids in by_shard(ids).items():
+        comments.update(queryset.using(alias).in_bulk(shard_ids))
+    return comments
+
+
+def merged(queryset, key=lambda comment: -comment.id, limit=None):
+    """
+    The rows of queryset from every shard, merged in queryset's order, which key
+    must sort by. At most limit rows are read from each shard.
+    """
+    results = [queryset.using(alias) for alias in shards()]
+    if limit is not None:
+        results = [result[:limit] for result in results]
+    return list(islice(heapq.merge(*results, key=key), limit))
+
+
+def copy_users(alias, users):
+    """Create or update users on shard alias, without the save signals."""
+    fields = [field.attname for field in User._meta.concrete_fields]
+    shard_users = User.objects.using(alias)
+    for user in users:
+        values = {name: getattr(user, name) for name in fields}
+        if not shard_users.filter(pk=user.pk).update(**values):
+            shard_users.bulk_create([User(**values)])
+
+
+def user_saved(sender, instance, raw=False, using=None, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.COMMENT_SHARDS[1:]:
+        copy_users(alias, [instance])
+
+
+def user_deleted(sender, instance, using=None, **kwargs):
+    if using != DEFAULT_DB_ALIAS:
+        return
+    from .deletion import delete_user_comments
+
+    # The default database deleted the user's comments there, in cascade. On the shards
+    # the user is only referenced by comments and archived comments.
+    for alias in settings.COMMENT_SHARDS[1:]:
+        delete_user_comments(instance.pk, alias)
+        users = User.objects.using(alias).filter(pk=instance.pk)
+        users._raw_delete(alias)
+
+
+def shard_migrated(sender, using, **kwargs):
+    if using in settings.COMMENT_SHARDS[1:]:
+        copy_users(using, User.objects.using(DEFAULT_DB_ALIAS).order_by("id").iterator())
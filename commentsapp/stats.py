@@ -0,0 +1,166 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import ArchivedComment, Comments, UserStats
+from .sharding import shard_for
+
+
+def _author(comment_id):
+    authors = Comments.objects.filter(pk=comment_id).values("user_id")
+    if settings.COMMENT_SHARDS:
+        # The comment isn't in the database of the counters.
+        return authors.using(shard_for(comment_id)).values_list("user_id", flat=True).first()
+    return Subquery(authors[:1])
+
+
+def adjust_stats(user_filter, **deltas):
+    # Greatest() keeps the counters from going negative when they have drifted.
+    updates = {
+        name: Greatest(F(name) + delta, Value(0)) for name, delta in deltas.items() if delta
+    }
+    if updates:
+        UserStats.objects.filter(**user_filter).update(**updates)
+
+
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+def comment_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_reply_id = (
+        Comments.objects.using(instance._state.db)
+        .filter(pk=instance.pk)
+        .values_list("reply_id", flat=True)
+        .first()
+    )
+
+
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_stats({"user_id": instance.user_id}, comments_count=1)
+        if instance.reply_id:
+            adjust_stats({"user_id": _author(instance.reply_id)}, replies_received=1)
+        return
+    previous_reply_id = getattr(instance, "_previous_reply_id", None)
+    if previous_reply_id != instance.reply_id:
+        if previous_reply_id:
+            adjust_stats({"user_id": _author(previous_reply_id)}, replies_received=-1)
+        if instance.reply_id:
+            adjust_stats({"user_id": _author(instance.reply_id)}, replies_received=1)
+
+
+def comments_created(comments, using=None):
+    """The counters of comments inserted in bulk, one update per user."""
+    written = Counter(comment.user_id for comment in comments)
+    reply_ids = {comment.reply_id for comment in comments if comment.reply_id}
+    authors = dict(
+        Comments.objects.using(using).filter(id__in=reply_ids).values_list("id", "user_id")
+    )
+    # A missing reply fails the foreign key check, at the latest on commit.
+    received = Counter(
+        authors[comment.reply_id] for comment in comments if comment.reply_id in authors
+    )
+    for user_id, count in written.items():
+        adjust_stats({"user_id": user_id}, comments_count=count)
+    for user_id, count in received.items():
+        adjust_stats({"user_id": user_id}, replies_received=count)
+
+
+def comment_pre_delete(sender, instance, **kwargs):
+    # Replies to a deleted comment become root comments (SET_NULL).
+    adjust_stats(
+        {"user_id": instance.user_id},
+        comments_count=-1,
+        replies_received=-instance.replies.count(),
+    )
+    if instance.reply_id:
+        adjust_stats({"user_id": _author(instance.reply_id)}, replies_received=-1)
+
+
+def reconcile_user_stats(batch_size=1000):
+    """
+    Recompute every user's counters from the Comments and ArchivedComment tables,
+    batch_size users per UPDATE (or one UPDATE per user, counted on every shard,
+    when sharded). Returns the number of users processed.
+    """
+    missing = User.objects.filter(stats__isnull=True).values_list("id", flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+    comments_count = (
+        Comments.objects.filter(user_id=OuterRef("user_id"))
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    replies_received = (
+        Comments.objects.filter(reply__user_id=OuterRef("user_id"))
+        .order_by()
+        .values("reply__user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    archived_count = (
+        ArchivedComment.objects.filter(user_id=OuterRef("user_id"))
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    archived_replies_received = (
+        ArchivedComment.objects.filter(reply_user_id=OuterRef("user_id"))
+        .order_by()
+        .values("reply_user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    processed = last_id = 0
+    while True:
+        batch = list(
+            UserStats.objects.filter(user_id__gt=last_id)
+            .order_by("user_id")
+            .values_list("user_id", flat=True)[:batch_size]
+        )
+        if not batch:
+            return processed
+        last_id = batch[-1]
+        if settings.COMMENT_SHARDS:
+            written, received = _count_on_shards(batch)
+            for user_id in batch:
+                processed += UserStats.objects.filter(user_id=user_id).update(
+                    comments_count=written[user_id], replies_received=received[user_id]
+                )
+            continue
+        processed += UserStats.objects.filter(user_id__in=batch).update(
+            comments_count=Coalesce(Subquery(comments_count), 0)
+            + Coalesce(Subquery(archived_count), 0),
+            replies_received=Coalesce(Subquery(replies_received), 0)
+            + Coalesce(Subquery(archived_replies_received), 0),
+        )
+
+
+def _count_on_shards(user_ids):
+    """The comments written and replies received by user_ids on all the shards."""
+    written, received = Counter(), Counter()
+    tables = ((Comments, "reply__user_id"), (ArchivedComment, "reply_user_id"))
+    for alias in settings.COMMENT_SHARDS:
+        for model, reply_user in tables:
+            rows = model.objects.using(alias).order_by()
+            by_user = rows.filter(user_id__in=user_ids).values_list("user_id")
+            written.update(dict(by_user.annotate(count=Count("id"))))
+            by_reply_user = rows.filter(**{reply_user + "__in": user_ids}).values_list(reply_user)
+            received.update(dict(by_reply_user.annotate(count=Count("id"))))
+    return written, received
@@ -0,0 +1,49 @@
+"""
+Streaming JSON lists, for list responses too large to hold in memory.
+
+The rows are read in keyset batches and each batch is serialized and rendered on its
+own, so a worker only ever holds one batch, whatever the number of rows.
+"""
+
+import heapq
+from itertools import chain, islice
+
+
+def keyset_batches(queryset, batch_size):
+    """The rows of queryset, ordered by -id, batch_size at a time."""
+    queryset = queryset.order_by("-id")
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield batch
+        if len(batch) < batch_size:
+            return
+        batch = list(queryset.filter(id__lt=batch[-1].id)[:batch_size])
+
+
+def merged_keyset_batches(querysets, batch_size):
+    """The rows of several querysets (one per shard), merged by -id, batch_size at a time."""
+    if len(querysets) == 1:
+        yield from keyset_batches(querysets[0], batch_size)
+        return
+    rows = heapq.merge(
+        *(chain.from_iterable(keyset_batches(queryset, batch_size)) for queryset in querysets),
+        key=lambda row: -row.id,
+    )
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_json_array(batches, serialize, renderer):
+    """Render the concatenation of serialize(batch) as one JSON array, batch by batch."""
+    yield b"["
+    separator = b""
+    for batch in batches:
+        # Render each batch as an array and splice the arrays together.
+        rendered = renderer.render(serialize(batch))[1:-1]
+        if rendered:
+            yield separator + rendered
+            separator = b","
+    yield b"]"
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from commentsapp.admin import estimated_count
+from commentsapp.models import Comments, UserStats
+
+
+class CommentsAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@gmail.com", "string")
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        root = Comments.objects.create(user=self.user, text="moderate this comment")
+        self.comments = [root] + [
+            Comments.objects.create(user=self.admin, text="reply %s" % number, reply=root)
+            for number in range(3)
+        ]
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries(self):
+        url = reverse("admin:commentsapp_comments_changelist")
+        self.client.get(url)
+        Comments.objects.bulk_create(
+            [Comments(user=self.user, text="bulk", reply=self.comments[0]) for _ in range(20)]
+        )
+        # Session, user, count and rows, whatever the number of comments.
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "moderate this comment")
+
+    def test_changelist_search(self):
+        url = reverse("admin:commentsapp_comments_changelist")
+        response = self.client.get(url, {"q": "moderate"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get(url, {"q": str(self.comments[2].id)})
+        self.assertEqual(list(response.context["cl"].result_list), [self.comments[2]])
+
+    def test_estimated_count(self):
+        url = reverse("admin:commentsapp_comments_changelist")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(estimated_count(Comments, "default"), 4)
+        Comments.objects.create(user=self.user, text="not analyzed yet")
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            self.assertEqual(self.client.get(url).context["cl"].result_count, 4)
+            response = self.client.get(url, {"q": "analyzed"})
+            self.assertEqual(response.context["cl"].result_count, 1)
+        self.assertEqual(self.client.get(url).context["cl"].result_count, 5)
+
+    def test_change_form_widgets(self):
+        response = self.client.get(
+            reverse("admin:commentsapp_comments_change", args=[self.comments[1].id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'class="vForeignKeyRawIdAdminField"')
+        self.assertContains(response, "admin-autocomplete")
+        self.assertNotContains(response, "reply 2</option>")
+
+    @override_settings(DELETION_BATCH_SIZE=2)
+    def test_delete_in_batches(self):
+        url = reverse("admin:commentsapp_comments_changelist")
+        response = self.client.get(url)
+        self.assertNotContains(response, 'value="delete_selected"')
+        self.assertContains(response, 'value="delete_in_batches"')
+        response = self.client.post(
+            url,
+            {
+                "action": "delete_in_batches",
+                "_selected_action": [comment.id for comment in self.comments[:3]],
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Deleted 3 comments.")
+        self.assertEqual(list(Comments.objects.all()), [self.comments[3]])
+        self.assertIsNone(Comments.objects.get().reply_id)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (0, 0))
+        self.assertEqual(UserStats.objects.get(user=self.admin).comments_count, 1)
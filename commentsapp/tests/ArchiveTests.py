@@ -0,0 +1,109 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp import archive, hot
+from commentsapp.archive import archive_cold_threads
+from commentsapp.models import ArchivedComment, Change, Comments, ThreadActivity, UserStats
+from commentsapp.stats import reconcile_user_stats
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        self.other = User.objects.create(email="test2@gmail.com", username="test2")
+        self.client.force_authenticate(self.user)
+        old = timezone.now() - timedelta(days=200)
+        with mock.patch.object(hot.time, "time", return_value=old.timestamp()):
+            self.cold = Comments.objects.create(user=self.user, text="cold", created_at=old)
+            self.reply = Comments.objects.create(
+                user=self.other, text="reply", reply=self.cold, created_at=old
+            )
+            self.nested = Comments.objects.create(
+                user=self.user, text="nested", reply=self.reply, created_at=old
+            )
+        self.live = Comments.objects.create(user=self.user, text="live")
+
+    def test_cold_threads_archived(self):
+        url = reverse("comment-detail", args=[self.cold.id])
+        params = {"expand": "user", "fields": "id,user,text,home,reply,replies"}
+        before = self.client.get(url, params).data
+        self.assertEqual(archive_cold_threads(days=180), (1, 3))
+        caches["default"].clear()
+
+        self.assertEqual(list(Comments.objects.values_list("id", flat=True)), [self.live.id])
+        self.assertEqual(ArchivedComment.objects.count(), 3)
+        self.assertFalse(ThreadActivity.objects.filter(root=self.cold.id).exists())
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, before)
+        nested = self.client.get(reverse("comment-detail", args=[self.nested.id])).data
+        self.assertEqual(nested["reply"], self.reply.id)
+        self.assertEqual(
+            [c["id"] for c in self.client.get(reverse("comment-list"), {"fields": "id"}).data],
+            [self.live.id],
+        )
+
+    def test_archived_comments_read_only(self):
+        archive_cold_threads(days=180)
+        url = reverse("comment-detail", args=[self.cold.id])
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            reverse("comment-list"), {"text": "late", "reply": self.cold.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.get(reverse("comment-detail", args=[999])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_active_threads_kept(self):
+        Comments.objects.create(user=self.other, text="revived", reply=self.nested)
+        self.assertEqual(archive_cold_threads(days=180), (0, 0))
+        self.assertEqual(archive_cold_threads(days=0), (2, 5))
+
+    def test_failed_threads_skipped(self):
+        Comments.objects.create(user=self.other, text="revived", reply=self.nested)
+        with mock.patch.object(
+            archive,
+            "add_partitions",
+            side_effect=[Exception("Failed"), mock.DEFAULT],
+            wraps=archive.add_partitions,
+        ), self.assertLogs("commentsapp.archive", "ERROR"):
+            self.assertEqual(archive_cold_threads(days=0), (1, 4))
+        self.assertEqual(list(Comments.objects.values_list("id", flat=True)), [self.live.id])
+
+    def test_changes_recorded(self):
+        since = Change.objects.last().seq
+        archive_cold_threads(days=180)
+        response = self.client.get(reverse("change-list"), {"since": since})
+        self.assertEqual(
+            sorted((c["object_id"], c["action"]) for c in response.data["results"]),
+            [(c.id, Change.UPDATE) for c in (self.cold, self.reply, self.nested)],
+        )
+        self.assertEqual(
+            [c["data"]["text"] for c in response.data["results"]], ["cold", "reply", "nested"]
+        )
+
+    def test_counters_kept(self):
+        archive_cold_threads(days=180)
+        UserStats.objects.update(comments_count=0, replies_received=0)
+        reconcile_user_stats()
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (3, 1))
+        stats = UserStats.objects.get(user=self.other)
+        self.assertEqual((stats.comments_count, stats.replies_received), (1, 1))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("archive_comments", "--limit", "1", stdout=out)
+        self.assertEqual(out.getvalue(), "Archived 1 threads, 3 comments.\n")
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from commentsapp import caching
+from commentsapp.caching import coalesced_cache_page, warm_cache
+from commentsapp.models import Comments
+
+
+class CoalescingTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.calls = 0
+
+    def view(self, request):
+        self.calls += 1
+        time.sleep(0.1)
+        return HttpResponse("page %s" % self.calls)
+
+    def test_concurrent_misses_computed_once(self):
+        view = coalesced_cache_page(60)(self.view)
+        responses = []
+
+        def get():
+            responses.append(view(RequestFactory().get("/coalesced/")))
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({response.content for response in responses}, {b"page 1"})
+        self.assertEqual(caching._flights, {})
+
+    def test_failure_releases_waiters(self):
+        def failing(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            coalesced_cache_page(60)(failing)(RequestFactory().get("/failing/"))
+        self.assertEqual(caching._flights, {})
+        response = coalesced_cache_page(60)(self.view)(RequestFactory().get("/failing/"))
+        self.assertEqual(response.content, b"page 1")
+
+
+@override_settings(WARM_CACHE_HOSTS=["testserver"])
+class WarmCacheTests(APITestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        self.roots = [Comments.objects.create(user=self.user, text="root") for _ in range(3)]
+        Comments.objects.create(user=self.user, text="reply", reply=self.roots[0])
+        self.client.force_authenticate(self.user)
+
+    def test_warm_cache(self):
+        with override_settings(WARM_CACHE_PAGES=5):
+            self.assertEqual(warm_cache(), 2 + 1 + 3)
+        with self.assertNumQueries(0):
+            for url in (
+                reverse("comment-list"),
+                reverse("user-list"),
+                reverse("comment-hot"),
+                reverse("comment-detail", args=[self.roots[1].id]),
+            ):
+                response = self.client.get(url, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_warm_cache_pages(self):
+        self.assertEqual(warm_cache(pages=0), 2)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("comment-list"), HTTP_ACCEPT="application/json")
+        with self.assertNumQueries(3):
+            self.client.get(reverse("comment-hot"), HTTP_ACCEPT="application/json")
+
+    def test_warm_cache_without_users(self):
+        User.objects.all().delete()
+        self.assertEqual(warm_cache(), 0)
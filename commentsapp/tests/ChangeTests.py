@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp.deletion import delete_comments
+from commentsapp.models import Change, Comments
+
+
+class ChangeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            email="test1@gmail.com", username="test1", password=make_password("string")
+        )
+        self.client.force_authenticate(self.user)
+        self.since = Change.objects.last().seq
+
+    def changes(self, since=None, **params):
+        response = self.client.get(reverse("change-list"), {"since": since or self.since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_comment_changes(self):
+        comment_id = self.client.post(reverse("comment-list"), {"text": "first"}).data["id"]
+        self.client.patch(reverse("comment-detail", args=[comment_id]), {"text": "edited"})
+        self.client.delete(reverse("comment-detail", args=[comment_id]))
+
+        data = self.changes()
+        self.assertEqual(
+            [(c["model"], c["object_id"], c["action"]) for c in data["results"]],
+            [
+                (Change.COMMENT, comment_id, Change.CREATE),
+                (Change.COMMENT, comment_id, Change.UPDATE),
+                (Change.COMMENT, comment_id, Change.DELETE),
+            ],
+        )
+        self.assertEqual([c["data"] for c in data["results"]], [None, None, None])
+        self.assertEqual(data["last_seq"], data["results"][-1]["seq"])
+        self.assertIsNone(data["next"])
+        self.assertEqual(self.changes(since=data["last_seq"])["results"], [])
+
+    def test_change_data(self):
+        comment = Comments.objects.create(user=self.user, text="current")
+        data = self.changes()
+        self.assertEqual(
+            data["results"][0]["data"],
+            {"id": comment.id, "user": self.user.id, "text": "current", "home": "", "reply": None},
+        )
+        self.user.first_name = "Test"
+        self.user.save()
+        change = self.changes(since=data["last_seq"])["results"][0]
+        self.assertEqual((change["model"], change["action"]), (Change.USER, Change.UPDATE))
+        self.assertEqual(change["data"]["first_name"], "Test")
+        self.assertNotIn("password", change["data"])
+
+    def test_pages(self):
+        comments = [Comments.objects.create(user=self.user, text=str(n)) for n in range(5)]
+        data = self.changes(page_size=2)
+        self.assertEqual([c["object_id"] for c in data["results"]], [c.id for c in comments[:2]])
+        self.assertIn("since=%s" % data["last_seq"], data["next"])
+        with self.assertNumQueries(2):
+            data = self.client.get(data["next"]).data
+        self.assertEqual([c["object_id"] for c in data["results"]], [c.id for c in comments[2:4]])
+
+    @override_settings(DELETION_BATCH_SIZE=2)
+    def test_batched_deletes_recorded(self):
+        root = Comments.objects.create(user=self.user, text="root")
+        replies = [
+            Comments.objects.create(user=self.user, text="reply", reply=root) for _ in range(3)
+        ]
+        since = Change.objects.last().seq
+        delete_comments(Comments.objects.filter(id=root.id))
+
+        changes = self.changes(since=since)["results"]
+        self.assertEqual(
+            sorted((c["object_id"], c["action"]) for c in changes),
+            [(root.id, Change.DELETE)] + [(reply.id, Change.UPDATE) for reply in replies],
+        )
+        self.assertEqual(changes[0]["data"]["reply"], None)
+
+    def test_postgresql_commit_order(self):
+        comments = [Comments.objects.create(user=self.user, text=str(n)) for n in range(4)]
+        changes = list(Change.objects.filter(seq__gt=self.since))
+        # The third change's transaction commits last, after the fourth was served.
+        for change, txid in zip(changes, [10, 5, 12, 11]):
+            Change.objects.filter(seq=change.seq).update(txid=txid)
+
+        with mock.patch("commentsapp.changes.commit_horizon", return_value=(12, None)):
+            data = self.changes()
+        ids = [c.id for c in comments]
+        self.assertEqual([c["object_id"] for c in data["results"]], [ids[1], ids[0], ids[3]])
+        with mock.patch("commentsapp.changes.commit_horizon", return_value=(13, None)):
+            data = self.changes(since=data["last_seq"])
+        self.assertEqual([c["object_id"] for c in data["results"]], [ids[2]])
+
+    def test_invalid_since(self):
+        response = self.client.get(reverse("change-list"), {"since": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,12 @@
+import json
+from unittest import skipIf
+
 from commentsapp.models import Comments
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.test import override_settings
 from django.urls import reverse
+from dzencodeproject.middleware import brotli
 from rest_framework import status
 from rest_framework.exceptions import ErrorDetail
 from rest_framework.test import APITestCase
@@ -101,6 +106,85 @@ class CommentsTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["home"], "https://google.com")
 
+    def test_comment_retrieve_replies_queries(self):
+        for number in range(5):
+            Comments.objects.create(user_id=number % 2 + 1, text="Reply %s" % number, reply_id=1)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("comment-detail", args=[1]),
+                data={"expand": "user", "fields": "user,replies"},
+            )
+        self.assertEqual(len(response.data["replies"]), 6)
+        self.assertEqual(response.data["replies"][0]["user"], response.data["user"])
+        self.assertEqual(
+            response.data["replies"][0]["user"],
+            {
+                "id": 1,
+                "email": "test1@gmail.com",
+                "username": "test1",
+                "first_name": "test1_name",
+                "last_name": "test1_surname",
+            },
+        )
+
+    # ------------------------------------BATCH RETRIEVE--------------------------------------------
+    def test_comment_batch_retrieve(self):
+        response = self.client.get(reverse("comment-list"), data={"ids": "2,7,1,2"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment["id"] for comment in response.data], [2, 7, 1])
+        self.assertEqual(response.data[1], {"id": 7, "detail": "Not found."})
+        self.assertEqual(
+            response.data[2], self.client.get(reverse("comment-detail", args=[1])).data
+        )
+
+    def test_comment_batch_retrieve_queries(self):
+        for number in range(5):
+            comment = Comments.objects.create(user_id=2, text="Comment %s" % number)
+            Comments.objects.create(user_id=1, text="Reply %s" % number, reply=comment)
+        ids = ",".join(str(comment.id) for comment in Comments.objects.all())
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("comment-list"), data={"ids": ids, "expand": "user"}
+            )
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data[0]["replies"][0]["user"]["username"], "test2")
+
+    def test_comment_batch_retrieve_include_users(self):
+        response = self.client.get(reverse("comment-list"), data={"ids": "1", "include": "users"})
+        self.assertEqual(response.data["data"][0]["replies"][0]["user"], 2)
+        self.assertEqual(set(response.data["included"]["users"]), {2})
+
+    def test_comment_batch_retrieve_wrong_ids(self):
+        response = self.client.get(reverse("comment-list"), data={"ids": "1,a"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            reverse("comment-list"), data={"ids": ",".join(map(str, range(1, 102)))}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # ------------------------------------STREAMED LIST---------------------------------------------
+    def stream(self, **params):
+        response = self.client.get(reverse("comment-list"), data={"stream": "true", **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_comment_list_streamed(self):
+        for number in range(5):
+            Comments.objects.create(user_id=2, text="Comment number %s" % number)
+        expected = self.client.get(reverse("comment-list"), data={"fields": "id,text,replies"})
+        with override_settings(STREAM_BATCH_SIZE=2), self.assertNumQueries(8):
+            self.assertEqual(self.stream(fields="id,text,replies"), expected.json())
+
+    def test_comment_list_streamed_include_users(self):
+        data = self.stream(include="users", expand="user")
+        self.assertEqual([comment["user"] for comment in data["data"]], [2, 1])
+        self.assertEqual(set(data["included"]["users"]), {"1", "2"})
+
+    def test_comment_list_streamed_empty(self):
+        Comments.objects.all().delete()
+        self.assertEqual(self.stream(), [])
+
     # -------------------------------------DESTROY COMMENT------------------------------------------
 
     def test_comment_destroy_wrong_not_authenticated(self):
@@ -224,3 +308,98 @@ class CommentsTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["reply"], 2)
+
+    # -----------------------------------SPARSE FIELDSETS-------------------------------------------
+    def test_comment_list_fields(self):
+        response = self.client.get(reverse("comment-list"), data={"fields": "id,text"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], {"id": 2, "text": "to disagree!"})
+
+    def test_comment_retrieve_expand_user(self):
+        response = self.client.get(
+            reverse("comment-detail", args=[1]), data={"fields": "id,user", "expand": "user"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["username"], "test1")
+
+    def test_comment_retrieve_include_users(self):
+        response = self.client.get(reverse("comment-detail", args=[1]), data={"include": "users"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"]["replies"][0]["user"], 2)
+        self.assertEqual(response.data["included"]["users"][2]["username"], "test2")
+
+    def test_comment_list_include_users(self):
+        response = self.client.get(
+            reverse("comment-list"), data={"include": "users", "expand": "user"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment["user"] for comment in response.data["data"]], [2, 1])
+        self.assertEqual(set(response.data["included"]["users"]), {1, 2})
+
+    # --------------------------------------COMPRESSION---------------------------------------------
+    def test_comment_list_compressed(self):
+        for number in range(30):
+            Comments.objects.create(user_id=1, text="Comment number %s" % number)
+        response = self.client.get(
+            reverse("comment-list"), data={"fields": "id,user,text"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    @skipIf(brotli is None, "brotli isn't installed")
+    def test_comment_list_compressed_brotli(self):
+        for number in range(30):
+            Comments.objects.create(user_id=1, text="Comment number %s" % number)
+        response = self.client.get(
+            reverse("comment-list"), data={"fields": "text,home"}, HTTP_ACCEPT_ENCODING="gzip, br"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))), 32)
+
+    # -------------------------------------SEARCH COMMENTS------------------------------------------
+    def test_comment_search_wrong_q_required(self):
+        response = self.client.get(reverse("comment-search"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["q"], [ErrorDetail(string="This field is required.", code="invalid")]
+        )
+
+    def test_comment_search_success(self):
+        response = self.client.get(reverse("comment-search"), data={"q": "agree"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["next"], None)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["id"], 1)
+        self.assertEqual(
+            response.data["results"][0]["highlight"], "Let&#x27;s <mark>agree</mark>"
+        )
+
+    def test_comment_search_highlight_escaped(self):
+        Comments.objects.create(user_id=1, text="<script>alert('found')</script>")
+        response = self.client.get(reverse("comment-search"), data={"q": "found"})
+        self.assertEqual(
+            response.data["results"][0]["highlight"],
+            "&lt;script&gt;alert(&#x27;<mark>found</mark>&#x27;)&lt;/script&gt;",
+        )
+
+    def test_comment_search_follows_writes(self):
+        self.client.patch(reverse("comment-detail", args=[1]), data={"text": "Hello!"})
+        response = self.client.get(reverse("comment-search"), data={"q": "hello"})
+        self.assertEqual([comment["id"] for comment in response.data["results"]], [1])
+
+        self.client.delete(reverse("comment-detail", args=[1]))
+        response = self.client.get(reverse("comment-search"), data={"q": "hello"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_comment_search_pagination(self):
+        for number in range(5):
+            Comments.objects.create(user_id=1, text="search me %s" % number)
+        response = self.client.get(reverse("comment-search"), data={"q": "search", "page_size": 2})
+        ids = [comment["id"] for comment in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [comment["id"] for comment in response.data["results"]]
+        self.assertEqual(sorted(ids), [3, 4, 5, 6, 7])
+        self.assertEqual(len(set(ids)), 5)
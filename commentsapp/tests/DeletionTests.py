@@ -0,0 +1,160 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp.deletion import delete_comments, run_pending_deletions, schedule_deletion
+from commentsapp.models import ArchivedComment, Change, Comments, DeletionJob, UserStats
+
+
+@override_settings(DELETION_BATCH_SIZE=2, DELETION_WORKER_THREAD=False)
+class DeletionTests(APITestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create(
+            email="test1@gmail.com", username="test1", password=make_password("string")
+        )
+        self.other = User.objects.create(
+            email="test2@gmail.com", username="test2", password=make_password("string")
+        )
+        self.comments = [
+            Comments.objects.create(user=self.user, text="comment %s" % number)
+            for number in range(5)
+        ]
+        for number in range(3):
+            Comments.objects.create(user=self.other, text="reply", reply=self.comments[0])
+        Comments.objects.create(user=self.user, text="reply", reply=Comments.objects.last())
+        self.client.force_authenticate(self.user)
+
+    def test_user_destroy_in_background(self):
+        response = self.client.delete(reverse("user-detail", args=[self.user.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], DeletionJob.PENDING)
+        self.assertEqual(response.data["total"], 6)
+        self.assertFalse(User.objects.get(pk=self.user.id).is_active)
+
+        self.assertEqual(run_pending_deletions(), 1)
+        job = DeletionJob.objects.get(pk=response.data["id"])
+        self.assertEqual((job.status, job.processed), (DeletionJob.DONE, 6))
+        self.assertFalse(User.objects.filter(pk=self.user.id).exists())
+        self.assertEqual(Comments.objects.filter(reply__isnull=False).count(), 0)
+        self.assertEqual(Comments.objects.count(), 3)
+        self.assertEqual(UserStats.objects.get(user=self.other).replies_received, 0)
+
+    def test_comment_destroy_in_background(self):
+        response = self.client.delete(reverse("comment-detail", args=[self.comments[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["total"], 3)
+
+        run_pending_deletions()
+        self.assertFalse(Comments.objects.filter(pk=self.comments[0].id).exists())
+        self.assertEqual(Comments.objects.filter(user=self.other, reply=None).count(), 3)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (5, 0))
+
+        response = self.client.get(reverse("deletion-detail", args=[response.data["id"]]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], DeletionJob.DONE)
+        self.assertEqual(response.data["processed"], 3)
+
+    def test_comment_hidden_until_deleted(self):
+        comment = self.comments[0]
+        response = self.client.delete(reverse("comment-detail", args=[comment.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        url = reverse("comment-detail", args=[comment.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.patch(url, {"text": "edited"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse("comment-list"), {"text": "reply", "reply": comment.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        ids = [c["id"] for c in self.client.get(reverse("comment-list")).data]
+        self.assertNotIn(comment.id, ids)
+        self.assertEqual(Comments.objects.get(pk=comment.id).text, "comment 0")
+
+    def test_jobs_visible_to_their_owner(self):
+        response = self.client.delete(reverse("comment-detail", args=[self.comments[0].id]))
+        url = reverse("deletion-detail", args=[response.data["id"]])
+        self.assertEqual(len(self.client.get(reverse("deletion-list")).data), 1)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(reverse("deletion-list")).data, [])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.other.is_staff = True
+        self.other.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_job_followed_with_token(self):
+        response = self.client.delete(reverse("user-detail", args=[self.user.id]))
+        url = reverse("deletion-detail", args=[response.data["id"]])
+        # Deactivated, the user can't authenticate anymore.
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(url, {"token": response.data["token"]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], DeletionJob.PENDING)
+        self.assertEqual(
+            self.client.get(url, {"token": "wrong"}).status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(reverse("deletion-list"), {"token": "wrong"}).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_user_comments_hidden_until_deleted(self):
+        self.client.delete(reverse("user-detail", args=[self.user.id]))
+        self.client.force_authenticate(self.other)
+        response = self.client.get(reverse("comment-list"), {"fields": "id"})
+        self.assertEqual(len(response.data), 3)
+        response = self.client.post(
+            reverse("comment-list"), {"text": "late", "reply": self.comments[1].id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_late_replies_detached(self):
+        # A reply added after the replies of the batch were detached.
+        with mock.patch("commentsapp.deletion._detach_replies"):
+            delete_comments(Comments.objects.filter(pk=self.comments[0].id))
+        self.assertFalse(Comments.objects.filter(pk=self.comments[0].id).exists())
+        self.assertEqual(Comments.objects.filter(user=self.other, reply=None).count(), 3)
+        self.assertEqual(UserStats.objects.get(user=self.user).replies_received, 0)
+
+    def test_user_archive_counted_and_deleted(self):
+        Comments.objects.filter(user=self.user).delete()
+        ArchivedComment.objects.bulk_create(
+            ArchivedComment(id=1000 + n, user=self.user, text="old", created_at=timezone.now())
+            for n in range(3)
+        )
+        response = self.client.delete(reverse("user-detail", args=[self.user.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        run_pending_deletions()
+        self.assertFalse(ArchivedComment.objects.exists())
+        self.assertEqual(DeletionJob.objects.get().processed, 3)
+
+    def test_small_comment_destroy_right_away(self):
+        response = self.client.delete(reverse("comment-detail", args=[self.comments[1].id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(DeletionJob.objects.exists())
+
+    def test_small_user_destroy_queries(self):
+        # The comments are deleted in bulk, the queries don't grow with their number.
+        queries = []
+        for count in (1, 10):
+            user = User.objects.create(email="user%s@gmail.com" % count, username="user%s" % count)
+            for _ in range(count):
+                Comments.objects.create(user=user, text="reply", reply=self.comments[1])
+            with self.settings(DELETION_BATCH_SIZE=10), CaptureQueriesContext(connection) as ctx:
+                self.assertIsNone(schedule_deletion(user))
+            queries.append(len(ctx))
+            self.assertFalse(User.objects.filter(pk=user.pk).exists())
+            self.assertFalse(Comments.objects.filter(user_id=user.pk).exists())
+        self.assertEqual(queries[0], queries[1])
+        deleted = Change.objects.filter(model=Change.COMMENT, action=Change.DELETE)
+        self.assertEqual(deleted.count(), 11)
+        self.assertEqual(UserStats.objects.get(user=self.user).replies_received, 3)
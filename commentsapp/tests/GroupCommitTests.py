@@ -0,0 +1,102 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from commentsapp import hot
+from commentsapp.group_commit import GroupCommitBuffer, GroupCommitTimeout
+from commentsapp.models import Change, Comments, ThreadActivity, UserStats
+
+
+@override_settings(GROUP_COMMIT_DELAY=200, GROUP_COMMIT_MAX_ROWS=5)
+class GroupCommitTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        self.buffer = GroupCommitBuffer()
+
+    def submit_all(self, comments):
+        results = {}
+
+        def submit(comment):
+            try:
+                results[comment.text] = self.buffer.submit(comment)
+            except Exception as e:
+                results[comment.text] = e
+
+        threads = [threading.Thread(target=submit, args=[comment]) for comment in comments]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_comments_committed_in_batches(self):
+        comments = [Comments(user=self.user, text="comment %s" % n) for n in range(7)]
+        with mock.patch.object(self.buffer, "flush", wraps=self.buffer.flush) as flush:
+            results = self.submit_all(comments)
+        self.assertEqual(sorted(len(call.args[0]) for call in flush.call_args_list), [2, 5])
+        self.assertEqual(
+            sorted(comment.pk for comment in results.values()),
+            sorted(Comments.objects.values_list("id", flat=True)),
+        )
+        self.assertEqual(UserStats.objects.get(user=self.user).comments_count, 7)
+
+    def test_side_effects_per_batch(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        root = Comments.objects.create(user=other, text="root")
+        score = ThreadActivity.objects.get(root=root).score
+        since = Change.objects.last().seq
+        comments = [Comments(user=self.user, text="reply %s" % n, reply=root) for n in range(3)]
+        comments.append(Comments(user=other, text="new root"))
+        with mock.patch.object(hot, "record_activity", wraps=hot.record_activity) as record:
+            results = self.submit_all(comments)
+        self.assertEqual(record.call_count, 2)
+        self.assertEqual(
+            sorted(Change.objects.filter(seq__gt=since).values_list("object_id", "action")),
+            sorted((comment.pk, Change.CREATE) for comment in results.values()),
+        )
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (3, 0))
+        stats = UserStats.objects.get(user=other)
+        self.assertEqual((stats.comments_count, stats.replies_received), (2, 3))
+        self.assertGreater(ThreadActivity.objects.get(root=root).score, score)
+        self.assertTrue(ThreadActivity.objects.filter(root=results["new root"]).exists())
+
+    @override_settings(GROUP_COMMIT_TIMEOUT=0.01)
+    def test_timeout(self):
+        comment = Comments(user=self.user, text="late")
+        # Never committed.
+        with mock.patch.object(self.buffer, "start"):
+            with self.assertRaises(GroupCommitTimeout) as context:
+                self.buffer.submit(comment)
+        self.assertEqual(context.exception.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.buffer.flush([self.buffer.queue.get()])
+        self.assertFalse(Comments.objects.exists())
+
+    def test_failed_comment_fails_alone(self):
+        comments = [
+            Comments(user=self.user, text="good"),
+            Comments(user=self.user, text="bad", reply_id=999),
+            Comments(user=self.user, text="also good"),
+        ]
+        with self.assertLogs("commentsapp.group_commit", "WARNING"):
+            results = self.submit_all(comments)
+        self.assertIsInstance(results["bad"], IntegrityError)
+        self.assertEqual(
+            set(Comments.objects.values_list("text", flat=True)), {"good", "also good"}
+        )
+        self.assertEqual(results["good"].pk, Comments.objects.get(text="good").pk)
+
+    @override_settings(COMMENT_GROUP_COMMIT=True, GROUP_COMMIT_DELAY=1)
+    def test_create(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse("comment-list"), {"text": "buffered"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["id"], Comments.objects.get(text="buffered").id)
+        self.assertEqual(response.data["user"], self.user.id)
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp import hot
+from commentsapp.deletion import run_pending_deletions
+from commentsapp.models import Comments, ThreadActivity
+
+
+@override_settings(HOT_THREADS_HALF_LIFE=3600)
+class HotThreadTests(APITestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        self.client.force_authenticate(self.user)
+        self.clock = mock.patch.object(hot.time, "time", mock.Mock(return_value=0))
+        self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def at(self, hours):
+        hot.time.time.return_value = hours * 3600
+
+    def comment(self, reply=None):
+        return Comments.objects.create(user=self.user, text="comment", reply=reply)
+
+    def hot_ids(self, **params):
+        response = self.client.get(reverse("comment-hot"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [thread["id"] for thread in response.data["results"]]
+
+    def test_replies_update_root(self):
+        root = self.comment()
+        self.assertAlmostEqual(ThreadActivity.objects.get(root=root).score, 0)
+        self.comment(reply=self.comment(reply=root))
+        self.assertAlmostEqual(ThreadActivity.objects.get(root=root).score, 1.5849625)
+        self.assertEqual(ThreadActivity.objects.count(), 1)
+
+    def test_activity_decays(self):
+        old, recent = self.comment(), self.comment()
+        for _ in range(3):
+            self.comment(reply=old)
+        self.assertEqual(self.hot_ids(), [old.id, recent.id])
+
+        self.at(3)
+        self.comment(reply=recent)
+        response = self.client.get(reverse("comment-hot"), {"fields": "id,activity"})
+        self.assertEqual([thread["id"] for thread in response.data["results"]], [recent.id, old.id])
+        self.assertAlmostEqual(response.data["results"][0]["activity"], 1 + 2 ** -3)
+        self.assertAlmostEqual(response.data["results"][1]["activity"], 4 * 2 ** -3)
+
+    def test_pages(self):
+        roots = [self.comment() for _ in range(5)]
+        for root in roots:
+            self.comment(reply=root)
+        response = self.client.get(reverse("comment-hot"), {"page_size": 2})
+        self.assertEqual([t["id"] for t in response.data["results"]], [roots[4].id, roots[3].id])
+        self.assertEqual(response.data["results"][0]["replies"][0]["text"], "comment")
+        with self.assertNumQueries(3):
+            response = self.client.get(response.data["next"])
+        self.assertEqual([t["id"] for t in response.data["results"]], [roots[2].id, roots[1].id])
+
+    def test_deleted_root_removed(self):
+        root = self.comment()
+        root.delete()
+        self.assertEqual(self.hot_ids(), [])
+
+    def test_reply_of_deleted_comment_becomes_root(self):
+        self.at(timezone.now().timestamp() / 3600)
+        root = self.comment()
+        reply = self.comment(reply=root)
+        self.comment(reply=reply)
+        root.delete()
+        self.assertEqual(self.hot_ids(), [reply.id])
+        score = hot.add_activity(reply.created_at.timestamp() / 3600, hot.now_score())
+        self.assertAlmostEqual(ThreadActivity.objects.get(root=reply).score, score, places=3)
+
+    @override_settings(DELETION_BATCH_SIZE=1, DELETION_WORKER_THREAD=False)
+    def test_replies_detached_in_background_become_roots(self):
+        self.at(timezone.now().timestamp() / 3600)
+        root = self.comment()
+        replies = [self.comment(reply=root) for _ in range(2)]
+        response = self.client.delete(reverse("comment-detail", args=[root.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        run_pending_deletions()
+        self.assertEqual(sorted(self.hot_ids()), [reply.id for reply in replies])
+
+    def test_reply_moved_out_becomes_root(self):
+        self.at(timezone.now().timestamp() / 3600)
+        root = self.comment()
+        reply = self.comment(reply=root)
+        response = self.client.patch(
+            reverse("comment-detail", args=[reply.id]), {"reply": None}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(self.hot_ids()), [root.id, reply.id])
+
+    def test_root_moved_into_thread(self):
+        root, other = self.comment(), self.comment()
+        self.comment(reply=other)
+        response = self.client.patch(reverse("comment-detail", args=[other.id]), {"reply": root.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.hot_ids(), [root.id])
+        # The three comments, at time 0.
+        self.assertAlmostEqual(ThreadActivity.objects.get(root=root).score, 1.5849625)
+
+    def test_add_activity_far_in_time(self):
+        score = hot.add_activity(1e6, 1e6)
+        self.assertEqual(score, 1e6 + 1)
+        self.assertEqual(hot.add_activity(score, 0), score)
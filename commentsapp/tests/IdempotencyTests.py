@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from commentsapp import serializers
+from commentsapp.models import Comments
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        caches["idempotency"].clear()
+        caches["throttle"].clear()
+        self.user = User.objects.create(
+            email="test1@gmail.com", username="test1", password=make_password("string")
+        )
+
+    def post(self, name, data, key):
+        return self.client.post(reverse(name), data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_comment_create_replayed(self):
+        self.client.force_authenticate(self.user)
+        first = self.post("comment-list", {"text": "once"}, "key-1")
+        retry = self.post("comment-list", {"text": "once"}, "key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Comments.objects.count(), 1)
+
+        other = self.post("comment-list", {"text": "once"}, "key-2")
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(other.has_header("Idempotent-Replayed"))
+        self.assertEqual(Comments.objects.count(), 2)
+
+    def test_form_data_after_csrf_check(self):
+        # The CSRF check of session authentication reads the multipart body first.
+        client = APIClient(enforce_csrf_checks=True)
+        client.login(username="test1", password="string")
+        token = "a" * 64
+        client.cookies["csrftoken"] = token
+        data = {"text": "once", "csrfmiddlewaretoken": token}
+        first = client.post(reverse("comment-list"), data, HTTP_IDEMPOTENCY_KEY="key-1")
+        retry = client.post(reverse("comment-list"), data, HTTP_IDEMPOTENCY_KEY="key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        data["text"] = "twice"
+        other = client.post(reverse("comment-list"), data, HTTP_IDEMPOTENCY_KEY="key-1")
+        self.assertEqual(other.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_keys_scoped_to_client(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        self.client.force_authenticate(self.user)
+        self.post("comment-list", {"text": "mine"}, "key")
+        self.client.force_authenticate(other)
+        response = self.post("comment-list", {"text": "mine"}, "key")
+        self.assertEqual(response.data["user"], other.id)
+        self.assertEqual(Comments.objects.count(), 2)
+
+    def test_key_reused_with_other_body(self):
+        self.client.force_authenticate(self.user)
+        self.post("comment-list", {"text": "first"}, "key")
+        response = self.post("comment-list", {"text": "second"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Comments.objects.count(), 1)
+
+    def test_key_in_progress(self):
+        self.client.force_authenticate(self.user)
+        cache = caches["idempotency"]
+        pending = {"fingerprint": "", "status": None}
+        with mock.patch.object(cache, "add", return_value=False):
+            with mock.patch.object(cache, "get", return_value=pending):
+                response = self.post("comment-list", {"text": "racing"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Comments.objects.count(), 0)
+
+    def test_errors_not_kept(self):
+        self.client.force_authenticate(self.user)
+        response = self.post("comment-list", {"home": "string"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post("comment-list", {"text": "fixed"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_signup_hashes_once(self):
+        data = {
+            "email": "new@gmail.com",
+            "username": "new",
+            "password": "string",
+            "confirm": "string",
+        }
+        with mock.patch.object(
+            serializers, "make_password", wraps=serializers.make_password
+        ) as hashing:
+            first = self.post("user-list", data, "signup")
+            retry = self.post("user-list", data, "signup")
+        self.assertEqual(hashing.call_count, 1)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(User.objects.filter(username="new").count(), 1)
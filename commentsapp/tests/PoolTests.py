@@ -0,0 +1,62 @@
+import sqlite3
+import threading
+
+from django.test import SimpleTestCase
+from dzencodeproject.db.pool import ConnectionPool, PoolTimeout
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        kwargs.setdefault("connect", lambda: sqlite3.connect(":memory:", check_same_thread=False))
+        kwargs.setdefault("check", lambda connection: connection.execute("SELECT 1"))
+        return ConnectionPool(**kwargs)
+
+    def test_pool_reuses_released_connection(self):
+        pool = self.make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        stats = pool.stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_pool_max_size_timeout(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_pool_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        threading.Timer(0.05, pool.release, args=[connection]).start()
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_pool_health_check_discards_broken_connection(self):
+        pool = self.make_pool(health_check_interval=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.close()
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, connection)
+        fresh.execute("SELECT 1")
+        stats = pool.stats()
+        self.assertEqual(stats["health_check_failures"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_pool_failed_reset_discards_connection(self):
+        def reset(connection):
+            raise sqlite3.OperationalError
+
+        pool = self.make_pool(reset=reset)
+        pool.release(pool.acquire())
+        self.assertEqual(pool.stats()["size"], 0)
+        self.assertEqual(pool.stats()["connections_closed"], 1)
+
+    def test_pool_prefill(self):
+        pool = self.make_pool(min_size=2)
+        pool.prefill()
+        self.assertEqual(pool.stats()["idle"], 2)
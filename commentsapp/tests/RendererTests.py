@@ -0,0 +1,81 @@
+import datetime
+import decimal
+import io
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from commentsapp import renderers
+from commentsapp.management.commands.benchmark_json import comment_payload
+from commentsapp.parsers import FastJSONParser
+from commentsapp.renderers import FastJSONRenderer
+
+
+class FastJSONTests(SimpleTestCase):
+    def assertSameRender(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def assertOrjsonRender(self, data):
+        """Same bytes as the stdlib renderer, without falling back to it."""
+        expected = JSONRenderer().render(data)
+        with mock.patch.object(JSONRenderer, "render", side_effect=AssertionError("fallback")):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    def test_render_comment_list(self):
+        self.assertSameRender(comment_payload(20, 3))
+
+    def test_render_comment_list_with_orjson(self):
+        self.assertOrjsonRender(comment_payload(20, 3))
+
+    def test_render_drf_types(self):
+        self.assertOrjsonRender(
+            {
+                "datetime": datetime.datetime(2024, 1, 17, 2, 14, 5, 123456, datetime.timezone.utc),
+                "date": datetime.date(2024, 1, 17),
+                "time": datetime.time(2, 14, 5),
+                "decimal": decimal.Decimal("1.5"),
+                1: "int key",
+            }
+        )
+
+    def test_render_big_int_falls_back(self):
+        # Above 64 bits for orjson.
+        self.assertSameRender({"big": 2**70})
+
+    def test_render_nan(self):
+        # orjson renders non-finite floats as null where the stdlib renderer raises.
+        self.assertEqual(
+            FastJSONRenderer().render({"nan": float("nan"), "inf": float("inf")}),
+            b'{"nan":null,"inf":null}',
+        )
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({"nan": float("nan")})
+
+    def test_render_escapes_line_separators(self):
+        self.assertSameRender({"text": "line\u2028separator\u2029"})
+
+    def test_render_indent(self):
+        self.assertSameRender({"id": 1}, "application/json; indent=4")
+
+    def test_render_none(self):
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_render_without_orjson(self):
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertSameRender(comment_payload(2, 2))
+
+    def test_parse(self):
+        body = JSONRenderer().render(comment_payload(5, 2))
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body))
+        )
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"text": NaN}'))
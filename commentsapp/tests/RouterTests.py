@@ -0,0 +1,76 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from dzencodeproject.db.routers import (
+    ReplicaRouter,
+    is_pinned,
+    pin_to_primary,
+    reset_read_routing,
+    route_reads_to_replicas,
+)
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp.models import Comments
+
+
+class FakeReplicaRouter(ReplicaRouter):
+    down = ()
+
+    def is_available(self, alias):
+        return alias not in self.down
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = FakeReplicaRouter()
+        self.token = route_reads_to_replicas()
+
+    def tearDown(self):
+        reset_read_routing(self.token)
+
+    def test_router_read_from_replica(self):
+        self.assertEqual(self.router.db_for_read(Comments), "replica1")
+
+    def test_router_write_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Comments), DEFAULT_DB_ALIAS)
+
+    def test_router_read_from_primary_outside_replica_context(self):
+        token = route_reads_to_replicas(False)
+        self.assertEqual(self.router.db_for_read(Comments), DEFAULT_DB_ALIAS)
+        reset_read_routing(token)
+
+    def test_router_fallback_to_primary(self):
+        self.router.down = ("replica1",)
+        self.assertEqual(self.router.db_for_read(Comments), DEFAULT_DB_ALIAS)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_PIN_SECONDS=60)
+class ReadYourWritesTests(APITestCase):
+    def setUp(self):
+        caches["replica_pin"].clear()
+        self.user = User.objects.create(
+            email="test1@gmail.com", username="test1", password=make_password("string")
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_write_pins_client_to_primary(self):
+        self.assertFalse(is_pinned("user:%s" % self.user.id))
+        response = self.client.post(reverse("comment-list"), data={"text": "string"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned("user:%s" % self.user.id))
+        # In its own cache, which can be shared by the processes.
+        self.assertTrue(caches["replica_pin"].get("primary-pin:user:%s" % self.user.id))
+
+    def test_failed_write_does_not_pin(self):
+        self.client.post(reverse("comment-list"), data={})
+        self.assertFalse(is_pinned("user:%s" % self.user.id))
+
+    def test_pin_expires(self):
+        with self.settings(REPLICA_PIN_SECONDS=0):
+            pin_to_primary("user:%s" % self.user.id)
+        self.assertFalse(is_pinned("user:%s" % self.user.id))
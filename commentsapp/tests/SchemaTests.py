@@ -0,0 +1,68 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import Client, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from dzencodeproject import schema
+
+
+class SchemaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_dir = Path(directory.name)
+        override = override_settings(SCHEMA_DIR=self.schema_dir, SCHEMA_CACHE_SECONDS=600)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema._documents.clear()
+        self.addCleanup(schema._documents.clear)
+
+    def test_schema_is_generated_once(self):
+        with mock.patch.object(schema, "generate_schema", wraps=schema.generate_schema) as generate:
+            first = self.client.get(reverse("schema"))
+            second = self.client.get(reverse("schema"))
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b"/comments/", first.content)
+        self.assertEqual(first["Cache-Control"], "public, max-age=600")
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_schema_revalidation(self):
+        etag = self.client.get(reverse("schema"))["ETag"]
+        response = self.client.get(reverse("schema"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_schema_formats(self):
+        yaml = self.client.get(reverse("schema"))
+        json = self.client.get(reverse("schema"), HTTP_ACCEPT="application/json")
+        self.assertTrue(yaml["Content-Type"].startswith("application/vnd.oai.openapi"))
+        self.assertEqual(json.json()["openapi"], "3.0.3")
+        self.assertNotEqual(yaml["ETag"], json["ETag"])
+
+    def test_schema_served_from_built_files(self):
+        paths = schema.build_schema_files()
+        self.assertEqual({path.name for path in paths}, {"openapi.yaml", "openapi.json"})
+        (self.schema_dir / "openapi.yaml").write_bytes(b"openapi: 3.0.3\n")
+        with mock.patch.object(schema, "generate_schema") as generate:
+            response = self.client.get(reverse("schema"))
+        generate.assert_not_called()
+        self.assertEqual(response.content, b"openapi: 3.0.3\n")
+
+    def test_swagger_ui_per_client(self):
+        first = self.client.get(reverse("swagger-ui"))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(reverse("schema").encode(), first.content)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertNotIn("public", first["Cache-Control"])
+        # The page embeds the client's own CSRF token.
+        token = first.cookies["csrftoken"].value
+        second = Client().get(reverse("swagger-ui"))
+        self.assertNotEqual(second.cookies["csrftoken"].value, token)
+        self.assertNotEqual(first.content, second.content)
+
+    def test_schema_rejects_unsafe_methods(self):
+        self.assertEqual(self.client.post(reverse("schema")).status_code, 405)
@@ -0,0 +1,271 @@
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connections
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from dzencodeproject.db.routers import shard_for
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from commentsapp import deletion, hot, sharding
+from commentsapp.archive import archive_cold_threads
+from commentsapp.deletion import schedule_deletion
+from commentsapp.group_commit import GroupCommitBuffer, PendingWrite
+from commentsapp.models import (
+    ArchivedComment,
+    Comments,
+    IdSequence,
+    ThreadActivity,
+    UserStats,
+)
+from commentsapp.stats import reconcile_user_stats
+
+SHARDS = ["default", "shard1", "shard2"]
+
+
+@override_settings(
+    COMMENT_SHARDS=SHARDS,
+    COMMENT_ID_BLOCK_SIZE=4,
+    DATABASE_ROUTERS=["dzencodeproject.db.routers.ShardRouter"],
+)
+class ShardingTests(APITransactionTestCase):
+    """Threads spread over the default database and two SQLite shards."""
+
+    # The shards are added to the connections in setUpClass(), before "__all__" is
+    # resolved; the test runner doesn't know about them.
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in SHARDS[1:]:
+            path = Path(cls.directory.name) / ("%s.sqlite3" % alias)
+            connections.databases[alias] = {"ENGINE": "django.db.backends.sqlite3", "NAME": path}
+            call_command("migrate", database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS[1:]:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        caches["default"].clear()
+        sharding._ids = iter(())
+        self.user = User.objects.create(email="test1@gmail.com", username="test1")
+        self.client.force_authenticate(self.user)
+
+    def comment(self, text="comment", reply=None, user=None):
+        return Comments.objects.create(user=user or self.user, text=text, reply=reply)
+
+    def test_threads_spread_over_shards(self):
+        roots = [self.comment() for _ in range(6)]
+        self.assertEqual({root._state.db for root in roots}, set(SHARDS))
+        for root in roots:
+            reply = self.comment(reply=self.comment(reply=root))
+            self.assertEqual(reply._state.db, root._state.db)
+            self.assertEqual(shard_for(reply.id), root._state.db)
+            self.assertTrue(Comments.objects.using(root._state.db).filter(pk=reply.pk).exists())
+            self.assertTrue(ThreadActivity.objects.using(root._state.db).filter(root=root).exists())
+        ids = [comment.id for alias in SHARDS for comment in Comments.objects.using(alias)]
+        self.assertEqual(len(ids), len(set(ids)), 18)
+
+    def test_ids_allocated_in_blocks(self):
+        self.comment()
+        reserved = IdSequence.objects.get().next_value
+        for _ in range(3):
+            self.comment()
+        self.assertEqual(IdSequence.objects.get().next_value, reserved)
+        self.comment()
+        self.assertEqual(IdSequence.objects.get().next_value, reserved + 4)
+
+    def test_ids_start_above_existing_comments(self):
+        Comments.objects.using("shard2").create(id=1001, user=self.user, text="old")
+        self.assertGreater(self.comment().id, 1001)
+
+    def test_shard_count_kept(self):
+        self.comment()
+        self.assertEqual(IdSequence.objects.get().shards, len(SHARDS))
+        sharding._ids = iter(())
+        with override_settings(COMMENT_SHARDS=SHARDS[:2]):
+            with self.assertRaises(ImproperlyConfigured):
+                self.comment()
+        self.assertEqual(Comments.objects.using("default").count(), 0)
+
+    def test_group_commit_fallback_keeps_ids(self):
+        buffer = GroupCommitBuffer()
+        comments = [
+            Comments(user=self.user, text="good"),
+            # Number 2 on the default database, with the last comment.
+            Comments(user=self.user, text="bad", reply_id=999),
+            Comments(user=self.user, text="also good"),
+        ]
+        writes = [PendingWrite(comment) for comment in comments]
+        with self.assertLogs("commentsapp.group_commit", "WARNING"):
+            buffer.flush(writes)
+        self.assertIsNotNone(writes[1].error)
+        self.assertEqual([comments[0].pk, comments[2].pk], [1 * 3 + 1, 3 * 3 + 0])
+        for comment in (comments[0], comments[2]):
+            shard = Comments.objects.using(shard_for(comment.pk))
+            self.assertTrue(shard.filter(pk=comment.pk).exists())
+
+    def test_users_copied_to_shards(self):
+        self.user.first_name = "Test"
+        self.user.save()
+        for alias in SHARDS[1:]:
+            self.assertEqual(User.objects.using(alias).get(pk=self.user.pk).first_name, "Test")
+
+    def test_list_merged_by_id(self):
+        comments = [self.comment("comment %s" % n) for n in range(5)]
+        response = self.client.get(reverse("comment-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [comment["id"] for comment in response.data],
+            sorted((comment.id for comment in comments), reverse=True),
+        )
+
+    def test_list_streamed(self):
+        comments = [self.comment("comment %s" % n) for n in range(5)]
+        with self.settings(STREAM_BATCH_SIZE=2):
+            response = self.client.get(reverse("comment-list"), {"stream": "true"})
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [comment["id"] for comment in data],
+            sorted((comment.id for comment in comments), reverse=True),
+        )
+
+    def test_detail_on_shard(self):
+        roots = [self.comment() for _ in range(3)]
+        root = next(root for root in roots if root._state.db == "shard2")
+        reply = self.comment("reply", reply=root)
+        url = reverse("comment-detail", args=[root.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["replies"][0]["id"], reply.id)
+        response = self.client.patch(url, {"text": "edited"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Comments.objects.using("shard2").get(pk=root.pk).text, "edited")
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(Comments.objects.using("shard2").get(pk=reply.pk).reply_id)
+
+    def test_create_and_reply(self):
+        response = self.client.post(reverse("comment-list"), {"text": "root"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        root_id = response.data["id"]
+        response = self.client.post(reverse("comment-list"), {"text": "reply", "reply": root_id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(shard_for(response.data["id"]), shard_for(root_id))
+
+    def test_reply_moved_within_shard(self):
+        roots = [self.comment() for _ in range(4)]
+        reply = self.comment("reply", reply=roots[0])
+        url = reverse("comment-detail", args=[reply.id])
+        response = self.client.patch(url, {"reply": roots[1].id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("reply", response.data)
+        reply.refresh_from_db()
+        self.assertEqual(reply.reply_id, roots[0].id)
+        response = self.client.patch(url, {"reply": roots[3].id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_batch_retrieve(self):
+        comments = [self.comment() for _ in range(3)]
+        ids = [comments[2].id, 1, comments[0].id]
+        response = self.client.get(reverse("comment-list"), {"ids": ",".join(map(str, ids))})
+        self.assertEqual([comment["id"] for comment in response.data], ids)
+        self.assertEqual(response.data[1], {"id": 1, "detail": "Not found."})
+
+    def test_search_all_shards(self):
+        comments = [self.comment("needle %s" % n) for n in range(3)]
+        self.comment("haystack")
+        response = self.client.get(reverse("comment-search"), {"q": "needle"})
+        self.assertEqual(
+            {comment["id"] for comment in response.data["results"]},
+            {comment.id for comment in comments},
+        )
+
+    def test_hot_threads_all_shards(self):
+        roots = [self.comment() for _ in range(3)]
+        self.comment(reply=roots[0])
+        response = self.client.get(reverse("comment-hot"), {"page_size": 2})
+        ids = [thread["id"] for thread in response.data["results"]]
+        self.assertEqual(ids[0], roots[0].id)
+        response = self.client.get(response.data["next"])
+        ids += [thread["id"] for thread in response.data["results"]]
+        self.assertEqual(sorted(ids), sorted(root.id for root in roots))
+
+    def test_counters(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        roots = [self.comment() for _ in range(3)]
+        for root in roots:
+            self.comment(reply=root, user=other)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (3, 3))
+        UserStats.objects.update(comments_count=0, replies_received=0)
+        reconcile_user_stats()
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.comments_count, stats.replies_received), (3, 3))
+        self.assertEqual(UserStats.objects.get(user=other).comments_count, 3)
+
+    def test_user_deleted_on_every_shard(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        roots = [self.comment(user=other) for _ in range(3)]
+        replies = [self.comment(reply=root) for root in roots]
+        other.delete()
+        for alias in SHARDS:
+            self.assertFalse(Comments.objects.using(alias).filter(user=other).exists())
+            self.assertFalse(User.objects.using(alias).filter(pk=other.pk).exists())
+        for reply in replies:
+            self.assertIsNone(Comments.objects.using(reply._state.db).get(pk=reply.pk).reply_id)
+
+    def test_user_with_archive_deleted_on_every_shard(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        old = timezone.now() - timedelta(days=200)
+        with mock.patch.object(hot.time, "time", return_value=old.timestamp()):
+            roots = [
+                Comments.objects.create(user=other, text="old", created_at=old) for _ in range(3)
+            ]
+            for root in roots:
+                reply = Comments.objects.create(
+                    user=other, text="old", reply=root, created_at=old
+                )
+                Comments.objects.create(user=self.user, text="old", reply=reply, created_at=old)
+        self.assertEqual(archive_cold_threads(days=180), (3, 9))
+        self.client.force_authenticate(other)
+        response = self.client.delete(reverse("user-detail", args=[other.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        for alias in SHARDS:
+            self.assertFalse(ArchivedComment.objects.using(alias).filter(user=other).exists())
+            self.assertFalse(User.objects.using(alias).filter(pk=other.pk).exists())
+            self.assertEqual(ArchivedComment.objects.using(alias).count(), 1)
+
+    def test_failed_user_deletion_rolled_back_on_every_shard(self):
+        other = User.objects.create(email="test2@gmail.com", username="test2")
+        roots = [self.comment(user=other) for _ in range(3)]
+        delete = deletion._delete_user_archive
+
+        def failing_delete(user_id, batch_size, using, job=None):
+            if using == "shard2":
+                raise IntegrityError("Failed")
+            delete(user_id, batch_size, using, job)
+
+        with mock.patch.object(deletion, "_delete_user_archive", failing_delete):
+            with self.assertRaises(IntegrityError):
+                schedule_deletion(other)
+        for root in roots:
+            self.assertTrue(Comments.objects.using(root._state.db).filter(pk=root.pk).exists())
+        self.assertTrue(User.objects.filter(pk=other.pk).exists())
@@ -0,0 +1,95 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path, reverse
+from django.urls.resolvers import RoutePattern, URLResolver
+
+from commentsapp import caching
+from commentsapp.management.commands.profile_startup import parse_import_times
+from commentsapp.models import IdSequence
+from dzencodeproject import readiness
+from dzencodeproject.urls import lazy_include
+
+
+class ReadinessTests(TestCase):
+    def test_ready(self):
+        response = self.client.get(reverse("ready"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"ready": True, "failing": []})
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_not_ready_without_database(self):
+        with mock.patch.object(readiness, "database_ready", return_value=False):
+            response = self.client.get(reverse("ready"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["failing"], ["database"])
+
+    def test_not_ready_database_error(self):
+        with mock.patch("django.db.backends.utils.CursorWrapper.execute") as execute:
+            execute.side_effect = OperationalError
+            self.assertFalse(readiness.database_ready())
+
+    def test_not_ready_until_migrated(self):
+        readiness._migrated = False
+        self.addCleanup(setattr, readiness, "_migrated", False)
+        plan = "django.db.migrations.executor.MigrationExecutor.migration_plan"
+        with mock.patch(plan, return_value=[("migration", False)]):
+            response = self.client.get(reverse("ready"))
+        self.assertEqual(response.json()["failing"], ["migrations"])
+        self.assertEqual(self.client.get(reverse("ready")).status_code, 200)
+        # Once applied, the migrations aren't checked anymore.
+        with mock.patch(plan) as migration_plan:
+            self.client.get(reverse("ready"))
+        migration_plan.assert_not_called()
+
+    @override_settings(COMMENT_SHARDS=[])
+    def test_not_ready_when_shards_changed(self):
+        IdSequence.objects.create(name="comments", next_value=1, shards=3)
+        response = self.client.get(reverse("ready"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["failing"], ["shards"])
+
+    @override_settings(WARM_CACHE_ON_STARTUP=True)
+    def test_not_ready_until_cache_warmed(self):
+        self.addCleanup(caching.cache_warmed.clear)
+        response = self.client.get(reverse("ready"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["failing"], ["cache"])
+        caching.cache_warmed.set()
+        self.assertEqual(self.client.get(reverse("ready")).status_code, 200)
+
+
+class StartupProfileTests(TestCase):
+    def test_parse_import_times(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       226 |       1261 |   django.utils.version\n"
+            "import time:      1035 |       2296 | django\n"
+        )
+        self.assertEqual(
+            parse_import_times(output),
+            [("django.utils.version", 0.226, 1.261, 1), ("django", 1.035, 2.296, 0)],
+        )
+
+    def test_profile_startup(self):
+        out = io.StringIO()
+        call_command("profile_startup", "--limit", "3", stdout=out)
+        output = out.getvalue()
+        self.assertIn("django.setup()", output)
+        self.assertIn("URLconf", output)
+        self.assertIn("django", output.split("Import time by package (ms):")[1])
+
+
+class LazyIncludeTests(SimpleTestCase):
+    def test_urlconf_imported_on_first_use(self):
+        lazy = lazy_include("admin/", "dzencodeproject.admin_urls", namespace="admin")
+        resolver = URLResolver(
+            RoutePattern(""), [path("ready/", readiness.ready_view, name="ready"), lazy]
+        )
+        self.assertEqual(resolver.reverse("ready"), "ready/")
+        self.assertNotIn("urlconf_module", lazy.__dict__)
+        self.assertEqual(resolver.resolve("admin/").url_name, "index")
+        self.assertIn("urlconf_module", lazy.__dict__)
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from commentsapp.throttling import CommentCreateThrottle, TokenBucketThrottle
+
+RATES = {"comment": "2/min", "signup": "1/min", "token": "1/min", "token_refresh": "1/min"}
+
+
+@mock.patch.object(TokenBucketThrottle, "THROTTLE_RATES", RATES)
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = User.objects.create(
+            email="test1@gmail.com", username="test1", password=make_password("string")
+        )
+        self.timer = mock.patch.object(TokenBucketThrottle, "timer", mock.Mock(return_value=1000))
+        self.timer.start()
+        self.addCleanup(self.timer.stop)
+
+    def set_time(self, seconds):
+        TokenBucketThrottle.timer.return_value = seconds
+
+    def test_comment_create_throttled(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            response = self.client.post(reverse("comment-list"), data={"text": "string"})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(reverse("comment-list"), data={"text": "string"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "30")
+        # Reads aren't throttled.
+        self.assertEqual(self.client.get(reverse("comment-list")).status_code, status.HTTP_200_OK)
+
+        self.set_time(1030)
+        response = self.client.post(reverse("comment-list"), data={"text": "string"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse("comment-list"), data={"text": "string"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_comment_bucket_refills(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            self.client.post(reverse("comment-list"), data={"text": "string"})
+        self.set_time(2000)
+        for _ in range(2):
+            response = self.client.post(reverse("comment-list"), data={"text": "string"})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_concurrent_refills_counted(self):
+        request, view = SimpleNamespace(user=self.user), SimpleNamespace(action="create")
+        self.assertTrue(CommentCreateThrottle().allow_request(request, view))
+        self.set_time(2000)
+        cache = caches["throttle"]
+        get = cache.get
+
+        def racing_get(key, *args):
+            # Another request refills the bucket right after this one read the TAT.
+            if racing_get.first:
+                racing_get.first = False
+                tat = get(key, *args)
+                self.assertTrue(CommentCreateThrottle().allow_request(request, view))
+                return tat
+            return get(key, *args)
+
+        racing_get.first = True
+        with mock.patch.object(cache, "get", racing_get):
+            self.assertTrue(CommentCreateThrottle().allow_request(request, view))
+        self.assertFalse(CommentCreateThrottle().allow_request(request, view))
+
+    def test_fails_closed(self):
+        request, view = SimpleNamespace(user=self.user), SimpleNamespace(action="create")
+        self.assertTrue(CommentCreateThrottle().allow_request(request, view))
+        cache = caches["throttle"]
+        # The key keeps expiring before it's incremented.
+        with mock.patch.object(cache, "incr", side_effect=ValueError):
+            throttle = CommentCreateThrottle()
+            self.assertFalse(throttle.allow_request(request, view))
+        self.assertEqual(throttle.wait(), 30)
+
+    def test_signup_throttled(self):
+        data = {"email": "test2@gmail.com", "username": "test2", "password": "s", "confirm": "s"}
+        response = self.client.post(reverse("user-list"), data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse("user-list"), data=data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "60")
+
+    def test_token_throttled(self):
+        data = {"username": "test1", "password": "wrong"}
+        response = self.client.post(reverse("token_obtain_pair"), data=data)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse("token_obtain_pair"), data=data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_token_refresh_own_bucket(self):
+        data = {"username": "test1", "password": "wrong"}
+        self.client.post(reverse("token_obtain_pair"), data=data)
+        response = self.client.post(reverse("token_refresh"), data={"refresh": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse("token_refresh"), data={"refresh": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
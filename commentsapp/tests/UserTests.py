@@ -1,3 +1,5 @@
+from commentsapp.models import Comments, UserStats
+from commentsapp.stats import reconcile_user_stats
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -162,6 +164,8 @@ class UserTests(APITestCase):
                 "username": "test3",
                 "first_name": "test3_name",
                 "last_name": "test3_surname",
+                "comments_count": 0,
+                "replies_received": 0,
             },
         )
 
@@ -212,6 +216,8 @@ class UserTests(APITestCase):
                 "username": "test1",
                 "first_name": "test1_name",
                 "last_name": "test1_surname",
+                "comments_count": 0,
+                "replies_received": 0,
             },
         )
 
@@ -499,3 +505,34 @@ class UserTests(APITestCase):
                 "last_name": "test1_surname",
             },
         )
+
+    # -------------------------------------USER STATS-----------------------------------------------
+    def assertStats(self, user_id, comments_count, replies_received):
+        stats = UserStats.objects.get(user_id=user_id)
+        self.assertEqual(
+            (stats.comments_count, stats.replies_received), (comments_count, replies_received)
+        )
+
+    def test_user_stats_maintained_on_write(self):
+        comment = Comments.objects.create(user_id=1, text="Let's agree")
+        reply = Comments.objects.create(user_id=2, text="to disagree!", reply=comment)
+        self.assertStats(1, 1, 1)
+        self.assertStats(2, 1, 0)
+
+        reply.reply = None
+        reply.save()
+        self.assertStats(1, 1, 0)
+
+        reply.reply = comment
+        reply.save()
+        comment.delete()
+        self.assertStats(1, 0, 0)
+        self.assertStats(2, 1, 0)
+
+    def test_user_stats_reconcile(self):
+        comment = Comments.objects.create(user_id=1, text="Let's agree")
+        Comments.objects.bulk_create([Comments(user_id=2, text="no", reply=comment)] * 2)
+        UserStats.objects.filter(user_id=2).delete()
+        self.assertEqual(reconcile_user_stats(batch_size=1), 2)
+        self.assertStats(1, 1, 2)
+        self.assertStats(2, 2, 0)
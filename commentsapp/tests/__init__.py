@@ -1,2 +1,17 @@
+from .AdminTests import CommentsAdminTests
+from .ArchiveTests import ArchiveTests
+from .CacheTests import CoalescingTests, WarmCacheTests
+from .ChangeTests import ChangeTests
 from .CommentTests import CommentsTests
+from .DeletionTests import DeletionTests
+from .GroupCommitTests import GroupCommitTests
+from .HotThreadTests import HotThreadTests
+from .IdempotencyTests import IdempotencyTests
+from .PoolTests import ConnectionPoolTests
+from .RendererTests import FastJSONTests
+from .RouterTests import ReadYourWritesTests, ReplicaRouterTests
+from .SchemaTests import SchemaTests
+from .ShardingTests import ShardingTests
+from .StartupTests import LazyIncludeTests, ReadinessTests, StartupProfileTests
+from .ThrottleTests import ThrottleTests
 from .UserTests import UserTests
@@ -0,0 +1,108 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle: a client can burst the number of requests of its rate,
+    the bucket then refills at rate requests per period.
+
+    Implemented as a generic cell rate algorithm: the only state is the client's
+    theoretical arrival time (TAT) stored in the THROTTLE_CACHE cache, shared by every
+    process using the same cache. Each request moves it to max(TAT, now) + interval
+    with one atomic incr(). While the TAT is ahead of now that's an increment of
+    interval. Once the bucket has refilled (TAT behind now), the request winning an
+    add() of a key for that TAT increments it by now + interval - TAT instead, and
+    requests racing it keep adding their interval: increments commute, so none is
+    lost. The default local memory cache is an atomic stand-in for a single process.
+    A request that can't update its TAT, the key expiring twice in between, is
+    throttled.
+    """
+
+    timer = time.time
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        period = self.duration * 1000
+        interval = max(period // self.num_requests, 1)
+        # The key outlives the period and is touched on refills and throttled
+        # requests, so it doesn't expire while the client is still throttled.
+        timeout = self.duration * 10
+        now = int(self.timer() * 1000)
+
+        for _ in range(2):
+            tat = self.cache.get(self.key)
+            if tat is None:
+                if self.cache.add(self.key, now + interval, timeout):
+                    return True
+                # Added in between.
+                continue
+            refill = tat < now and self.cache.add("%s:refill:%s" % (self.key, tat), True, timeout)
+            increment = now + interval - tat if refill else interval
+            try:
+                tat = self.cache.incr(self.key, increment)
+            except ValueError:
+                # Expired in between.
+                continue
+            if tat - now > period:
+                self.cache.decr(self.key, increment)
+                self.cache.touch(self.key, timeout)
+                self.wait_seconds = (tat - now - period) / 1000
+                return False
+            if refill:
+                self.cache.touch(self.key, timeout)
+            return True
+        self.wait_seconds = interval / 1000
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CommentCreateThrottle(TokenBucketThrottle):
+    """Comments created per user."""
+
+    scope = "comment"
+
+    def get_cache_key(self, request, view):
+        if view.action != "create":
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": request.user.pk}
+
+
+class SignupThrottle(TokenBucketThrottle):
+    """Users created per client address."""
+
+    scope = "signup"
+
+    def get_cache_key(self, request, view):
+        if view.action != "create":
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class TokenThrottle(TokenBucketThrottle):
+    """Token requests per client address."""
+
+    scope = "token"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class TokenRefreshThrottle(TokenThrottle):
+    """Token refreshes per client address, apart from the token requests."""
+
+    scope = "token_refresh"
@@ -6,6 +6,8 @@ from . import views
 router = DefaultRouter()
 router.register(r"users", views.UserViewSet, basename="user")
 router.register(r"comments", views.CommentsViewSet, basename="comment")
+router.register(r"deletions", views.DeletionJobViewSet, basename="deletion")
+router.register(r"changes", views.ChangeViewSet, basename="change")
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,31 +1,85 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.http import Http404, StreamingHttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from rest_framework import viewsets
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
-from .models import Comments
-from .permissions import IsOwnerOrAuthenticated, IsOwnerOrAuthenticatedOrPost
-from .serializers import CommentSerializer, UserSerializer
+from .caching import coalesced_cache_page
+from .changes import current_objects
+from .deletion import job_id_for_token, schedule_deletion
+from .group_commit import comment_buffer
+from .hot import hot_threads
+from .mixins import IdempotencyMixin, ReplicaReadMixin, SideloadMixin
+from .models import ArchivedComment, Change, Comments, DeletionJob
+from .pagination import ChangePagination, SearchPagination
+from .permissions import (
+    IsAuthenticatedOrJobToken,
+    IsOwnerOrAuthenticated,
+    IsOwnerOrAuthenticatedOrPost,
+)
+from .renderers import FastJSONRenderer
+from .search import search_comments
+from .serializers import (
+    ArchivedCommentSerializer,
+    ChangeSerializer,
+    CommentSearchSerializer,
+    CommentSerializer,
+    DeletionJobSerializer,
+    HotThreadSerializer,
+    ScheduledDeletionJobSerializer,
+    UserDetailSerializer,
+    UserSerializer,
+    with_replies,
+)
+from .sharding import in_bulk, merged, shard_for, shards
+from .streaming import merged_keyset_batches, stream_json_array
+from .throttling import CommentCreateThrottle, SignupThrottle
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, IdempotencyMixin, viewsets.ModelViewSet):
     """
     A viewset that provides default create(), , update(), partial_update()
     and destroy() actions. retrieve() and list() actions caching for 1 minute.
+    create() honours the Idempotency-Key header.
+    retrieve() includes the user's comment counters. destroy() of a user with
+    many comments is done in the background and answers 202 with the job.
     """
 
     queryset = User.objects.exclude(is_staff=True)
     serializer_class = UserSerializer
     permission_classes = [IsOwnerOrAuthenticatedOrPost]
+    throttle_classes = [SignupThrottle]
 
-    @method_decorator(cache_page(60 * 1))
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "retrieve":
+            return queryset.select_related("stats")
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return UserDetailSerializer
+        return self.serializer_class
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        job = schedule_deletion(instance)
+        if job is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(ScheduledDeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @method_decorator(coalesced_cache_page(60 * 1))
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
-    @method_decorator(cache_page(60 * 1))
+    @method_decorator(coalesced_cache_page(60 * 1))
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
@@ -38,33 +92,202 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class CommentsViewSet(viewsets.ModelViewSet):
+class CommentsViewSet(ReplicaReadMixin, IdempotencyMixin, SideloadMixin, viewsets.ModelViewSet):
     """
     A viewset that provides default create(), , update(), partial_update()
     and destroy() actions. retrieve() and list() actions caching for 1 minute.
+    create() honours the Idempotency-Key header, and saves the comment with
+    others in one transaction with COMMENT_GROUP_COMMIT. Reads support
+    ?fields=, ?expand=user and ?include=users. list() with ?ids=1,2,3 returns
+    those comments in that order, with ?stream=true all of them as a streamed
+    response. retrieve() also finds archived comments. search() finds
+    comments by text, hot() the most active threads. destroy() of a comment
+    with many replies is done in the background and answers 202 with the job.
     """
 
-    queryset = Comments.objects.all().order_by("-id")
+    queryset = Comments.objects.visible().order_by("-id")
     serializer_class = CommentSerializer
     permission_classes = [IsOwnerOrAuthenticated]
+    throttle_classes = [CommentCreateThrottle]
+    replica_actions = ("list", "retrieve", "search", "hot")
+    max_batch_ids = 100
+
+    def get_shard(self):
+        """The shard of the comment in the URL, None (routed as usual) without one."""
+        pk = str(self.kwargs.get(self.lookup_field, ""))
+        return shard_for(int(pk)) if pk.isdigit() else None
+
+    def get_queryset(self):
+        return super().get_queryset().using(self.get_shard())
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        if settings.COMMENT_GROUP_COMMIT:
+            comment = Comments(user=self.request.user, **serializer.validated_data)
+            serializer.instance = comment_buffer.submit(comment)
+        else:
+            serializer.save(user=self.request.user)
 
-    @method_decorator(cache_page(60 * 1))
-    def retrieve(self, request, *args, **kwargs):
+    def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
+        job = schedule_deletion(instance)
+        if job is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(ScheduledDeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @method_decorator(coalesced_cache_page(60 * 1))
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            instance = self.get_object()
+        except Http404:
+            return self.retrieve_archived(request)
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        return self.sideload(Response(serializer.data), serializer)
+
+    def retrieve_archived(self, request):
+        archive = ArchivedComment.objects.using(self.get_shard())
+        instance = get_object_or_404(archive, pk=self.kwargs["pk"])
+        self.check_object_permissions(request, instance)
+        serializer = ArchivedCommentSerializer(instance, context=self.get_serializer_context())
+        return self.sideload(Response(serializer.data), serializer)
 
-    @method_decorator(cache_page(60 * 1))
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "ids",
+                str,
+                description="Comma separated ids of the comments to return, in that order. "
+                'Missing comments are returned as {"id": id, "detail": "Not found."}.',
+            ),
+            OpenApiParameter(
+                "stream", bool, description="Stream all comments as JSON, batch by batch."
+            ),
+        ]
+    )
+    @method_decorator(coalesced_cache_page(60 * 1))
     def list(self, request, *args, **kwargs):
+        if "ids" in request.query_params:
+            return self.batch_retrieve(request)
+        if request.query_params.get("stream") in ("1", "true"):
+            return self.stream_list(request)
+
         queryset = self.filter_queryset(self.get_queryset())
+        if settings.COMMENT_SHARDS:
+            queryset = merged(queryset)
 
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.sideload(self.get_paginated_response(serializer.data), serializer)
 
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.sideload(Response(serializer.data), serializer)
+
+    def batch_retrieve(self, request):
+        try:
+            ids = request.query_params["ids"].split(",")
+            ids = list(dict.fromkeys(int(pk) for pk in ids if pk))
+        except ValueError:
+            raise ValidationError({"ids": ["A comma separated list of integers is required."]})
+        if len(ids) > self.max_batch_ids:
+            raise ValidationError({"ids": ["At most %d ids are allowed." % self.max_batch_ids]})
+
+        comments = in_bulk(with_replies(self.get_queryset()), ids)
+        serializer = self.get_serializer([comments[pk] for pk in ids if pk in comments], many=True)
+        found = iter(serializer.data)
+        data = [next(found) if pk in comments else {"id": pk, "detail": "Not found."} for pk in ids]
+        return self.sideload(Response(data), serializer)
+
+    def stream_list(self, request):
+        queryset = with_replies(self.filter_queryset(self.get_queryset()))
+        # The response is rendered after dispatch() has reset the read routing.
+        querysets = [queryset.using(alias or queryset.db) for alias in shards()]
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        renderer = FastJSONRenderer()
+
+        def serialize(batch):
+            return serializer_class(batch, many=True, context=context).data
+
+        def content():
+            data = stream_json_array(
+                merged_keyset_batches(querysets, settings.STREAM_BATCH_SIZE), serialize, renderer
+            )
+            if "included_users" not in context:
+                yield from data
+                return
+            yield b'{"data":'
+            yield from data
+            yield b',"included":' + renderer.render(self.get_included(context)) + b"}"
+
+        return StreamingHttpResponse(content(), content_type=renderer.media_type)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("q", str, required=True, description="Words to search for."),
+            OpenApiParameter("cursor", str),
+            OpenApiParameter("page_size", int),
+        ]
+    )
+    @action(detail=False, serializer_class=CommentSearchSerializer)
+    def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": ["This field is required."]})
+
+        paginator = SearchPagination()
+        comments = paginator.paginate(
+            request, lambda limit, after: search_comments(query, limit, after)
+        )
+        serializer = self.get_serializer(comments, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter("cursor", str), OpenApiParameter("page_size", int)]
+    )
+    @method_decorator(coalesced_cache_page(60 * 1))
+    @action(detail=False, serializer_class=HotThreadSerializer)
+    def hot(self, request):
+        paginator = SearchPagination()
+        threads = paginator.paginate(request, hot_threads)
+        serializer = self.get_serializer(threads, many=True)
+        return self.sideload(paginator.get_paginated_response(serializer.data), serializer)
+
+
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Progress of the deletions done in the background, of the user's own account and
+    comments (of every deletion for staff). A job is also read with ?token= set to
+    the token of the 202 response, as deleting a user deactivates them.
+    """
+
+    queryset = DeletionJob.objects.all().order_by("-id")
+    serializer_class = DeletionJobSerializer
+    permission_classes = [IsAuthenticatedOrJobToken]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        token = self.request.query_params.get("token")
+        if token is not None:
+            return queryset.filter(pk=job_id_for_token(token))
+        if self.request.user.is_staff:
+            return queryset
+        # A job tells which user or comment is being deleted: only its owner sees it.
+        return queryset.filter(owner_id=self.request.user.pk)
+
+
+class ChangeViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
+    """
+    The change log of comments and users, oldest first. Poll with ?since= set to the
+    last_seq of the previous response to sync incrementally.
+    """
+
+    queryset = Change.objects.all()
+    serializer_class = ChangeSerializer
+    pagination_class = ChangePagination
+
+    def list(self, request):
+        changes = self.paginate_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        context["objects"] = current_objects(changes)
+        serializer = self.get_serializer_class()(changes, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
@@ -1,5 +1,14 @@
 #!/bin/bash
 
+# Fast boot: serve right away, the first container runs the setup below. /ready/ answers
+# 503 until the database is reachable and migrated.
+case "${FAST_BOOT,,}" in
+    1|true|yes)
+        echo "Starting Server (fast boot)..."
+        exec python manage.py runserver --noreload ${APP_HOST}:${APP_PORT}
+        ;;
+esac
+
 # wait for db to start
 echo "Wait for db to start..."
 echo ====================================
@@ -13,6 +22,10 @@ echo "Starting tests..."
 python manage.py test 
 echo ====================================
 
+echo "Building OpenAPI schema..."
+python manage.py build_schema
+echo ====================================
+
 echo "Creating Superuser..."
 python manage.py createsuperuser --no-input 
 echo ====================================
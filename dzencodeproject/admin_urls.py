@@ -0,0 +1,12 @@
+"""
+The admin URLs, imported on the first admin request (see lazy_include in urls.py).
+
+With FAST_BOOT the admin modules aren't autodiscovered on startup, so they're
+imported here. Otherwise they already are and autodiscover() does nothing.
+"""
+
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
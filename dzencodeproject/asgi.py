@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dzencodeproject.settings')
 
 application = get_asgi_application()
+
+if settings.WARM_CACHE_ON_STARTUP:
+    from commentsapp.caching import warm_cache_in_background
+
+    warm_cache_in_background()
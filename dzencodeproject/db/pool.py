@@ -0,0 +1,235 @@
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """
+    No connection became available before the pool timeout expired.
+    """
+
+
+class _Entry:
+    __slots__ = ("connection", "created_at", "last_used")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of DB-API connections shared by every thread of the process.
+
+    Idle connections are handed out most-recently-used first. A connection idle for
+    longer than health_check_interval is pinged with check() before reuse, and
+    connections older than max_lifetime or idle for longer than max_idle are closed
+    instead of being reused. reset() is called on every connection handed back.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=10,
+        min_size=0,
+        timeout=30,
+        max_idle=300,
+        max_lifetime=1800,
+        health_check_interval=30,
+        check=None,
+        reset=None,
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.check = check
+        self.reset = reset
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+        self._metrics = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "acquired": 0,
+            "reused": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+        }
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self._checkout(deadline)
+            if entry is None:
+                entry = self._create()
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+            with self._cond:
+                if entry.last_used != entry.created_at:
+                    self._metrics["reused"] += 1
+                self._in_use[id(entry.connection)] = entry
+                self._metrics["acquired"] += 1
+            return entry.connection
+
+    def release(self, connection, discard=False):
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            # Not ours (e.g. handed out before the pool was cleared); just close it.
+            self._close_connection(connection)
+            return
+        if not discard and self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if discard or now - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def prefill(self):
+        """Open connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            entry = self._create()
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close_all(self):
+        """Close idle connections. Connections in use are closed on release."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            in_use, self._in_use = self._in_use, {}
+            self._size -= len(idle) + len(in_use)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_connection(entry.connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                **self._metrics,
+            }
+
+    def _checkout(self, deadline):
+        """
+        Pop an idle entry, or reserve a slot for a new connection and return None.
+        """
+        waited_since = None
+        expired = []
+        try:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        entry = self._idle.pop()
+                        if (
+                            now - entry.last_used > self.max_idle
+                            or now - entry.created_at > self.max_lifetime
+                        ):
+                            self._size -= 1
+                            expired.append(entry)
+                            continue
+                        return entry
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise PoolTimeout(
+                            "Couldn't get a connection within %s seconds (max_size=%s)."
+                            % (self.timeout, self.max_size)
+                        )
+                    if waited_since is None:
+                        waited_since = now
+                        self._metrics["waits"] += 1
+                    self._cond.wait(remaining)
+        finally:
+            if waited_since is not None:
+                with self._cond:
+                    self._metrics["wait_time"] += time.monotonic() - waited_since
+            for entry in expired:
+                self._close_connection(entry.connection)
+
+    def _create(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._count("connections_created")
+        return _Entry(connection)
+
+    def _is_healthy(self, entry):
+        if self.check is None or time.monotonic() - entry.last_used < self.health_check_interval:
+            return True
+        self._count("health_checks")
+        try:
+            if self.check(entry.connection) is not False:
+                return True
+        except Exception:
+            pass
+        self._count("health_check_failures")
+        return False
+
+    def _discard(self, entry):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close_connection(entry.connection)
+
+    def _count(self, name):
+        with self._cond:
+            self._metrics[name] += 1
+
+    def _close_connection(self, connection):
+        self._count("connections_closed")
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **options):
+    """Return the process-wide pool registered under key, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(**options)
+            pool.prefill()
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for (alias, _), pool in pools.items()}
@@ -0,0 +1,75 @@
+"""
+PostgreSQL backend that borrows connections from an in-process pool.
+
+Use it as ENGINE "dzencodeproject.db.postgresql" and configure the pool with a
+"POOL" dict in the database settings (see settings.py). Closing the connection at
+the end of a request hands it back to the pool instead of disconnecting.
+"""
+
+import psycopg2.extras
+from django.db import utils
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..pool import PoolTimeout, get_pool
+
+
+def _connect(conn_params, isolation_level):
+    # Mirrors the base get_new_connection() without touching a wrapper, since
+    # pooled connections outlive the thread that opened them.
+    connection = base.Database.connect(**conn_params)
+    if isolation_level is not None and isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def _check(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _reset(connection):
+    if connection.closed:
+        raise utils.InterfaceError("connection already closed")
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get("POOL", {})
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        key = (self.alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+        return get_pool(
+            key,
+            connect=lambda: _connect(conn_params, isolation_level),
+            max_size=options.get("MAX_SIZE", 10),
+            min_size=options.get("MIN_SIZE", 0),
+            timeout=options.get("TIMEOUT", 30),
+            max_idle=options.get("MAX_IDLE", 300),
+            max_lifetime=options.get("MAX_LIFETIME", 1800),
+            health_check_interval=options.get("HEALTH_CHECK_INTERVAL", 30),
+            check=_check,
+            reset=_reset,
+        )
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeout as e:
+            raise utils.OperationalError(str(e)) from e
+        # A reused connection keeps the isolation level it was opened with.
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # Django keeps a connection closed inside an atomic block around until
+            # the block exits, so it can't be handed to another thread.
+            self.pool.release(self.connection, discard=self.in_atomic_block)
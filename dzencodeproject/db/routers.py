@@ -0,0 +1,121 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_down_until = {}
+
+
+def route_reads_to_replicas(enabled=True):
+    """
+    Send reads made in the current context to the replicas. Returns a token for
+    reset_read_routing().
+    """
+    return _replica_reads.set(enabled)
+
+
+def reset_read_routing(token):
+    _replica_reads.reset(token)
+
+
+def pin_to_primary(key):
+    """Keep reads for key on the primary for REPLICA_PIN_SECONDS (read-your-writes)."""
+    caches[settings.REPLICA_PIN_CACHE].set(
+        "primary-pin:%s" % key, True, settings.REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned(key):
+    return caches[settings.REPLICA_PIN_CACHE].get("primary-pin:%s" % key, False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random available replica while replica reads are enabled for
+    the current context, everything else to the primary.
+
+    A replica that fails to connect is skipped for REPLICA_RETRY_SECONDS, falling
+    back to the other replicas and finally to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        replicas = list(settings.DATABASE_REPLICAS)
+        random.shuffle(replicas)
+        for alias in replicas:
+            if self.is_available(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def is_available(self, alias):
+        if _down_until.get(alias, 0) > time.monotonic():
+            return False
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+            return False
+        return True
+
+
+# Models stored with their thread on its shard.
+SHARDED_MODELS = {
+    "commentsapp.comments",
+    "commentsapp.threadactivity",
+    "commentsapp.archivedcomment",
+}
+
+
+def shard_for(comment_id):
+    """
+    The database of the thread of comment_id (or of the thread root_id for activity),
+    None without sharding.
+    """
+    shards = settings.COMMENT_SHARDS
+    if not shards:
+        return None
+    return shards[comment_id % len(shards)]
+
+
+class ShardRouter:
+    """
+    Sends queries about a comment, its replies or its thread's activity to the shard
+    of its thread, from the comment's id (see commentsapp.sharding). Other queries
+    are left to the next router, and to the default database.
+
+    Users are copied to every shard, so comments can relate to them on any shard.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if model._meta.label_lower not in SHARDED_MODELS or instance is None:
+            return None
+        if instance._meta.label_lower not in SHARDED_MODELS:
+            return None
+        if instance._state.adding:
+            # A new comment gets its id, and so its shard, when it's saved.
+            return shard_for(instance.pk) if instance.pk is not None else None
+        return instance._state.db
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        # A reply is placed on the shard of the comment it replies to.
+        if labels <= SHARDED_MODELS or "auth.user" in labels:
+            return True
+        return None
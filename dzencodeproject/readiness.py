@@ -0,0 +1,75 @@
+"""
+Readiness of the process to take traffic, for load balancers and orchestrators.
+
+GET /ready/ answers 200 once the database answers, its migrations are applied, the
+comment ids were handed out for the current shards and, with WARM_CACHE_ON_STARTUP,
+the cache is warm. Until then it answers 503 with the
+names of the failing checks. It needs no credentials and is never cached.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+# Migrations aren't unapplied, so they're only checked until they're all applied.
+_migrated = False
+
+
+def database_ready():
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return False
+    return True
+
+
+def migrations_applied():
+    global _migrated
+    if not _migrated:
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        _migrated = not executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return _migrated
+
+
+def shards_unchanged():
+    from commentsapp.sharding import check_shard_count
+
+    # Only once migrated, the failing migrations are reported instead.
+    if not migrations_applied():
+        return True
+    try:
+        check_shard_count()
+    except ImproperlyConfigured:
+        return False
+    return True
+
+
+def cache_warmed():
+    if not settings.WARM_CACHE_ON_STARTUP:
+        return True
+    from commentsapp.caching import cache_warmed
+
+    return cache_warmed.is_set()
+
+
+def failing_checks():
+    if not database_ready():
+        return ["database"]
+    checks = (
+        ("migrations", migrations_applied),
+        ("shards", shards_unchanged),
+        ("cache", cache_warmed),
+    )
+    return [name for name, check in checks if not check()]
+
+
+@never_cache
+@require_safe
+def ready_view(request):
+    failing = failing_checks()
+    return JsonResponse({"ready": not failing, "failing": failing}, status=503 if failing else 200)
@@ -0,0 +1,88 @@
+"""
+The OpenAPI schema served from memory instead of being rebuilt on every request.
+
+The schema is generated by "manage.py build_schema" (run on startup by django.sh)
+into SCHEMA_DIR, and generated once per process if the files are missing. It's
+served with an ETag and long-lived cache headers, and 304 to revalidations. The
+Swagger UI page embeds the visitor's CSRF token, so it's rendered for every request
+and never cached.
+"""
+
+import hashlib
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition, require_safe
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularSwaggerView
+
+RENDERERS = {"yaml": OpenApiYamlRenderer, "json": OpenApiJsonRenderer}
+
+_documents = {}
+_lock = threading.Lock()
+
+
+class Document:
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+    def response(self):
+        response = HttpResponse(self.content, content_type=self.content_type)
+        response["ETag"] = self.etag
+        patch_cache_control(response, public=True, max_age=settings.SCHEMA_CACHE_SECONDS)
+        return response
+
+
+def generate_schema():
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def build_schema_files():
+    """Write the schema in every format to SCHEMA_DIR. Returns the written paths."""
+    schema = generate_schema()
+    settings.SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for format, renderer in RENDERERS.items():
+        path = settings.SCHEMA_DIR / ("openapi.%s" % format)
+        path.write_bytes(renderer().render(schema, renderer_context={}))
+        paths.append(path)
+    with _lock:
+        _documents.clear()
+    return paths
+
+
+def get_schema_document(format):
+    with _lock:
+        document = _documents.get(format)
+        if document is None:
+            path = settings.SCHEMA_DIR / ("openapi.%s" % format)
+            if path.exists():
+                content = path.read_bytes()
+            else:
+                content = RENDERERS[format]().render(generate_schema(), renderer_context={})
+            document = _documents[format] = Document(content, RENDERERS[format].media_type)
+        return document
+
+
+def _schema_format(request):
+    if request.GET.get("format") == "json" or "json" in request.META.get("HTTP_ACCEPT", ""):
+        return "json"
+    return "yaml"
+
+
+@require_safe
+@condition(etag_func=lambda request: get_schema_document(_schema_format(request)).etag)
+def schema_view(request):
+    response = get_schema_document(_schema_format(request)).response()
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+swagger_view = never_cache(require_safe(SpectacularSwaggerView.as_view(url_name="schema")))
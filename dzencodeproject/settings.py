@@ -19,11 +19,14 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Defer loading the admin until its first request, see "Fast boot" in the README.
+FAST_BOOT = os.environ.get("FAST_BOOT", "0").lower() in ("1", "true", "yes")
+
 
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    "django.contrib.admin.apps.SimpleAdminConfig" if FAST_BOOT else "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -44,8 +47,68 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "commentsapp.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "commentsapp.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_RATES": {
+        "comment": os.environ.get("THROTTLE_RATE_COMMENT") or "30/min",
+        "signup": os.environ.get("THROTTLE_RATE_SIGNUP") or "20/min",
+        "token": os.environ.get("THROTTLE_RATE_TOKEN") or "10/min",
+        "token_refresh": os.environ.get("THROTTLE_RATE_TOKEN_REFRESH") or "30/min",
+    },
+}
+
+# Throttle state, idempotency keys and replica pins live in their own caches. Point them
+# at a shared cache (e.g. memcached) when running several processes; the default local
+# memory cache is per process.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND")
+        or "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION") or "",
+    },
+    "throttle": {
+        "BACKEND": os.environ.get("THROTTLE_CACHE_BACKEND")
+        or "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": os.environ.get("THROTTLE_CACHE_LOCATION") or "throttle",
+    },
+    "idempotency": {
+        "BACKEND": os.environ.get("IDEMPOTENCY_CACHE_BACKEND")
+        or "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": os.environ.get("IDEMPOTENCY_CACHE_LOCATION") or "idempotency",
+    },
+    "replica_pin": {
+        "BACKEND": os.environ.get("REPLICA_PIN_CACHE_BACKEND")
+        or "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": os.environ.get("REPLICA_PIN_CACHE_LOCATION") or "replica_pin",
+    },
 }
+THROTTLE_CACHE = "throttle"
+IDEMPOTENCY_CACHE = "idempotency"
+REPLICA_PIN_CACHE = "replica_pin"
+# Longest wait for another request computing the same uncached page.
+CACHE_COALESCE_TIMEOUT = float(os.environ.get("CACHE_COALESCE_TIMEOUT") or 10)
+# Pages cached by "manage.py warm_cache", and on startup with WARM_CACHE_ON_STARTUP.
+WARM_CACHE_ON_STARTUP = os.environ.get("WARM_CACHE_ON_STARTUP", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+WARM_CACHE_PAGES = int(os.environ.get("WARM_CACHE_PAGES") or 3)
+# Cached pages vary on the host and the Accept header clients send.
+WARM_CACHE_HOSTS = (
+    os.environ.get("WARM_CACHE_HOSTS") or "localhost:%s" % (os.environ.get("APP_PORT") or 8000)
+).split(",")
+WARM_CACHE_ACCEPT = (os.environ.get("WARM_CACHE_ACCEPT") or "application/json").split(",")
+# How long the response to an Idempotency-Key is kept for replays.
+IDEMPOTENCY_KEY_SECONDS = int(os.environ.get("IDEMPOTENCY_KEY_SECONDS") or 24 * 60 * 60)
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Comments SPA Swagger API",
@@ -54,9 +117,15 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
 }
 
+# Precomputed OpenAPI schema, written by "manage.py build_schema".
+SCHEMA_DIR = BASE_DIR / "openapi"
+# Cache lifetime of the schema responses, revalidated by ETag afterwards.
+SCHEMA_CACHE_SECONDS = int(os.environ.get("SCHEMA_CACHE_SECONDS") or 3600)
+
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "dzencodeproject.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -65,6 +134,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Responses smaller than this are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE") or 1024)
+# 0-11, the default favours speed over ratio.
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY") or 4)
+
 ROOT_URLCONF = "dzencodeproject.urls"
 
 TEMPLATES = [
@@ -97,9 +171,109 @@ DATABASES = {
         "NAME": os.environ.get("DB_NAME"),
         "PORT": os.environ.get("DB_PORT"),
         "HOST": os.environ.get("DB_HOST"),
+        # Seconds to keep a connection open between requests, 0 closes it after each one.
+        # Leave it at 0 under runserver, which starts a new thread for every request.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE") or 0),
     }
 }
 
+# Optional in-process connection pool (PostgreSQL only). Connections are handed back
+# to the pool at the end of each request, so CONN_MAX_AGE should stay at 0.
+if os.environ.get("DB_POOL", "").lower() in ("1", "true", "yes"):
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+        DATABASES["default"]["ENGINE"] = "dzencodeproject.db.postgresql"
+    DATABASES["default"]["POOL"] = {
+        "MAX_SIZE": int(os.environ.get("DB_POOL_MAX_SIZE") or 10),
+        "MIN_SIZE": int(os.environ.get("DB_POOL_MIN_SIZE") or 0),
+        "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT") or 30),
+        "MAX_IDLE": float(os.environ.get("DB_POOL_MAX_IDLE") or 300),
+        "MAX_LIFETIME": float(os.environ.get("DB_POOL_MAX_LIFETIME") or 1800),
+        "HEALTH_CHECK_INTERVAL": float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL") or 30),
+    }
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1:5432,replica2. For SQLite the entries
+# are database file paths. Reads of the list/retrieve actions go to the replicas.
+DATABASE_REPLICAS = []
+replica_hosts = os.environ.get("DB_REPLICA_HOSTS", "")
+for number, replica in enumerate(filter(None, replica_hosts.split(",")), 1):
+    alias = "replica%s" % number
+    DATABASES[alias] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES["default"]["PORT"])
+    DATABASE_REPLICAS.append(alias)
+
+# Comment shards, e.g. DB_SHARD_HOSTS=shard1:5432,shard2, entries as for the replicas.
+# Threads are spread over the default database and these by root id, see
+# commentsapp/sharding.py.
+COMMENT_SHARDS = []
+shard_hosts = os.environ.get("DB_SHARD_HOSTS", "")
+for number, shard in enumerate(filter(None, shard_hosts.split(",")), 1):
+    alias = "shard%s" % number
+    DATABASES[alias] = {**DATABASES["default"]}
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = shard.strip()
+    else:
+        host, _, port = shard.strip().partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES["default"]["PORT"])
+    COMMENT_SHARDS.append(alias)
+if COMMENT_SHARDS:
+    COMMENT_SHARDS.insert(0, "default")
+# Comment ids each process reserves at a time from the default database when sharded.
+COMMENT_ID_BLOCK_SIZE = int(os.environ.get("COMMENT_ID_BLOCK_SIZE") or 100)
+
+DATABASE_ROUTERS = []
+if COMMENT_SHARDS:
+    DATABASE_ROUTERS.append("dzencodeproject.db.routers.ShardRouter")
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS.append("dzencodeproject.db.routers.ReplicaRouter")
+
+# Seconds a client reads from the primary after a write, so it sees its own changes.
+REPLICA_PIN_SECONDS = int(os.environ.get("DB_REPLICA_PIN_SECONDS") or 5)
+# Seconds an unreachable replica is skipped before it's tried again.
+REPLICA_RETRY_SECONDS = int(os.environ.get("DB_REPLICA_RETRY_SECONDS") or 30)
+
+# Deleting a user with more comments, or a comment with more replies, than this is done
+# in batches of this size by a background worker instead of within the request.
+DELETION_BATCH_SIZE = int(os.environ.get("DELETION_BATCH_SIZE") or 1000)
+# Run deletion jobs in a thread of the web process. Disable when running
+# "manage.py process_deletions" as a separate worker instead.
+DELETION_WORKER_THREAD = os.environ.get("DELETION_WORKER_THREAD", "1").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Seconds after which a running job that made no progress is picked up again.
+DELETION_STALE_SECONDS = int(os.environ.get("DELETION_STALE_SECONDS") or 300)
+
+# Age after which change log events are served on databases other than PostgreSQL and
+# SQLite, see commentsapp/changes.py.
+CHANGES_SETTLE_SECONDS = float(os.environ.get("CHANGES_SETTLE_SECONDS") or 1)
+
+# Save new comments in batches, one transaction per GROUP_COMMIT_MAX_ROWS comments or
+# GROUP_COMMIT_DELAY milliseconds, see commentsapp/group_commit.py. Requests whose comment
+# isn't committed within GROUP_COMMIT_TIMEOUT seconds answer 503.
+COMMENT_GROUP_COMMIT = os.environ.get("COMMENT_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+GROUP_COMMIT_DELAY = float(os.environ.get("GROUP_COMMIT_DELAY") or 5)
+GROUP_COMMIT_MAX_ROWS = int(os.environ.get("GROUP_COMMIT_MAX_ROWS") or 100)
+GROUP_COMMIT_TIMEOUT = float(os.environ.get("GROUP_COMMIT_TIMEOUT") or 10)
+
+# Comments read, serialized and sent at a time by streamed lists (?stream=true).
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE") or 500)
+
+# Seconds after which a comment counts half as much in the hot threads ranking.
+HOT_THREADS_HALF_LIFE = int(os.environ.get("HOT_THREADS_HALF_LIFE") or 6 * 60 * 60)
+
+# Days without a new comment after which "manage.py archive_comments" archives a thread.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS") or 180)
+
+# Admin changelists of tables with at least this many rows show an estimated total.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    os.environ.get("ADMIN_ESTIMATED_COUNT_THRESHOLD") or 100000
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
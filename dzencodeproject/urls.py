@@ -1,18 +1,52 @@
-from django.contrib import admin
+from commentsapp.throttling import TokenRefreshThrottle, TokenThrottle
 from django.urls import include, path
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from django.urls.resolvers import RoutePattern, URLResolver
+from django.utils.module_loading import import_string
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
+from .readiness import ready_view
+
+
+def lazy_view(dotted_path):
+    """The view at dotted_path, imported on its first request instead of on startup."""
+
+    def view(request, *args, **kwargs):
+        return import_string(dotted_path)(request, *args, **kwargs)
+
+    return view
+
+
+class LazyURLResolver(URLResolver):
+    def _populate(self):
+        # reverse() populates every resolver, which would import the URLconf. Until a
+        # URL of this one is resolved or reversed, it has nothing to add.
+        if "urlconf_module" in self.__dict__:
+            super()._populate()
+
+
+def lazy_include(route, urlconf, namespace):
+    """
+    include(), with urlconf imported when a URL in its namespace is first resolved or
+    reversed instead of on startup.
+    """
+    return LazyURLResolver(RoutePattern(route), urlconf, app_name=namespace, namespace=namespace)
+
+
 urlpatterns = [
+    path("", lazy_view("dzencodeproject.schema.swagger_view"), name="swagger-ui"),
+    path("", include("commentsapp.urls")),
     path(
-        "",
-        SpectacularSwaggerView.as_view(url_name="schema"),
-        name="swagger-ui",
+        "api/token/",
+        TokenObtainPairView.as_view(throttle_classes=[TokenThrottle]),
+        name="token_obtain_pair",
+    ),
+    path(
+        "api/token/refresh/",
+        TokenRefreshView.as_view(throttle_classes=[TokenRefreshThrottle]),
+        name="token_refresh",
     ),
-    path("", include("commentsapp.urls")),
-    path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/token/verify/", TokenVerifyView.as_view(), name="token_verify"),
-    path("admin/", admin.site.urls),
-    path("schema/", SpectacularAPIView.as_view(), name="schema"),
+    lazy_include("admin/", "dzencodeproject.admin_urls", namespace="admin"),
+    path("schema/", lazy_view("dzencodeproject.schema.schema_view"), name="schema"),
+    path("ready/", ready_view, name="ready"),
 ]
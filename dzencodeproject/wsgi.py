@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dzencodeproject.settings')
 
 application = get_wsgi_application()
+
+if settings.WARM_CACHE_ON_STARTUP:
+    from commentsapp.caching import warm_cache_in_background
+
+    warm_cache_in_background()